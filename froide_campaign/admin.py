@@ -2,7 +2,7 @@ import csv
 import io
 from datetime import timedelta
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django import forms
 from django.shortcuts import redirect
 from django.utils.translation import gettext_lazy as _
@@ -11,13 +11,14 @@ from django.utils import timezone
 from django.core.exceptions import PermissionDenied
 from django.db.models import Count
 
+from froide.campaign.models import Campaign as FroideCampaign
 from froide.helper.admin_utils import make_nullfilter
 from froide.helper.csv_utils import export_csv_response
 
 from .models import (CampaignPage, Campaign, InformationObject,
-                     CampaignSubscription,
+                     CampaignSubscription, CampaignProgress,
                      Questionaire, Question, Report, Answer)
-from .utils import CSVImporter
+from .utils import CSVImporter, refresh_campaign_statistics
 
 
 class CampaignPageAdmin(admin.ModelAdmin):
@@ -34,11 +35,87 @@ class CampaignAdmin(admin.ModelAdmin):
         'paused',
     )
 
+    actions = ['refresh_statistics']
+
+    def refresh_statistics(self, request, queryset):
+        skipped = []
+        for campaign in queryset:
+            try:
+                refresh_campaign_statistics(campaign)
+            except FroideCampaign.DoesNotExist:
+                skipped.append(str(campaign))
+        self.message_user(request, _("Statistics have been refreshed."))
+        if skipped:
+            self.message_user(
+                request,
+                _("Skipped campaigns without request campaign: %s") % (
+                    ', '.join(skipped)
+                ),
+                level=messages.WARNING
+            )
+    refresh_statistics.short_description = _("Refresh statistics")
+
 
 class CampaignSubscriptionsAdmin(admin.ModelAdmin):
     list_filter = ('campaign',)
     list_display = ('campaign', 'email')
 
+    actions = ['export_csv']
+
+    def get_urls(self):
+        urls = super().get_urls()
+        my_urls = [
+            url(r'^upload/$',
+                self.admin_site.admin_view(self.upload_subscriptions),
+                name='froide_campaign-admin_upload_subscriptions'),
+        ]
+        return my_urls + urls
+
+    def export_csv(self, request, queryset):
+        queryset = queryset.order_by('campaign_id', 'id')
+        csv_generator = CampaignSubscription.objects.export_csv(
+            queryset.iterator()
+        )
+        return export_csv_response(csv_generator)
+    export_csv.short_description = _("Export to CSV")
+
+    def upload_subscriptions(self, request):
+        if not request.method == 'POST':
+            raise PermissionDenied
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        changelist = redirect(
+            'admin:froide_campaign_campaignsubscription_changelist'
+        )
+        csv_file = request.FILES.get('file')
+        if csv_file is None:
+            self.message_user(
+                request, _('Please choose a CSV file.'), level=messages.ERROR
+            )
+            return changelist
+        reader = csv.DictReader(
+            io.TextIOWrapper(csv_file.file, encoding='utf-8')
+        )
+        try:
+            inserted, skipped = CampaignSubscription.objects.bulk_subscribe(
+                (line.get('campaign_id'), line.get('email'))
+                for line in reader
+            )
+        except (csv.Error, UnicodeDecodeError) as e:
+            self.message_user(
+                request, _('Could not read CSV file: %s') % e,
+                level=messages.ERROR
+            )
+            return changelist
+        self.message_user(
+            request, _('%(inserted)d subscriptions imported, '
+                       '%(skipped)d rows skipped.') % {
+                'inserted': inserted, 'skipped': skipped
+            }
+        )
+        return changelist
+
 
 class InformationObjectAdmin(admin.ModelAdmin):
     list_display = (
@@ -183,9 +260,19 @@ class CampaignReportAdmin(admin.ModelAdmin):
     ]
 
 
+class CampaignProgressAdmin(admin.ModelAdmin):
+    list_filter = ('campaign',)
+    list_display = (
+        'campaign', 'date', 'request_count', 'new_request_count',
+        'resolved_count', 'new_resolved_count', 'new_location_count'
+    )
+    date_hierarchy = 'date'
+
+
 admin.site.register(CampaignPage, CampaignPageAdmin)
 admin.site.register(Campaign, CampaignAdmin)
 admin.site.register(InformationObject, InformationObjectAdmin)
 admin.site.register(CampaignSubscription, CampaignSubscriptionsAdmin)
 admin.site.register(Questionaire, CampaignQuestionaireAdmin)
 admin.site.register(Report, CampaignReportAdmin)
+admin.site.register(CampaignProgress, CampaignProgressAdmin)
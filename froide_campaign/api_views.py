@@ -1,7 +1,15 @@
 import random
+from datetime import timedelta
 
-from django.contrib.gis.geos import Point
+from django.contrib.gis.geos import Point, Polygon
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date
 
 from rest_framework import mixins
 from rest_framework import viewsets
@@ -12,16 +20,28 @@ from rest_framework.decorators import action
 
 from froide.foirequest.api_views import throttle_action
 
+from .cache import (make_cache_key, get_campaign_version,
+                    get_questionaire_version, bump_questionaire_version)
 from .models import (Campaign, InformationObject,
-                     CampaignSubscription, Questionaire,
-                     Question, Report, Answer)
+                     CampaignSubscription, CampaignProgress, Questionaire,
+                     Question, Report)
 
 from .serializers import InformationObjectSerializer
 from .serializers import CampaignProviderRequestSerializer
 from .geocode import run_geocode
+from .metrics import measure_latency, record_cache_lookup
+from .utils import get_questionaire_objects
 
 from .providers.base import BaseProvider
 
+QUESTIONAIRE_CACHE_TIMEOUT = 60
+PROGRESS_DEFAULT_DAYS = 90
+PROGRESS_MAX_DAYS = 3 * 366
+PROGRESS_FIELDS = (
+    'date', 'request_count', 'new_request_count', 'resolved_count',
+    'new_resolved_count', 'location_count', 'new_location_count'
+)
+
 
 def get_lat_lng(request):
     try:
@@ -35,6 +55,15 @@ def get_lat_lng(request):
     return lat, lng
 
 
+def get_bbox(request):
+    bbox = [float(x) for x in request.GET.get('bbox', '').split(',')]
+    if len(bbox) != 4:
+        raise ValueError
+    bbox = Polygon.from_bbox(bbox)
+    bbox.srid = 4326
+    return bbox
+
+
 class AddLocationPermission(permissions.BasePermission):
     def has_permission(self, request, view):
         campaign_id = request.data.get('campaign')
@@ -84,11 +113,10 @@ class InformationObjectViewSet(mixins.CreateModelMixin,
         )
         provider = campaign.get_provider()
         ident = kwargs.pop('pk')
-        obj = provider.get_by_ident(ident)
-        data = provider.get_provider_item_data(obj)
-        data['publicbody'] = provider.get_publicbody(ident)
-        data['publicbodies'] = provider.get_publicbodies(ident)
-        data['makeRequestURL'] = provider.get_request_url(ident)
+        try:
+            data = provider.detail_bundle(ident)
+        except ObjectDoesNotExist:
+            raise Http404
 
         serializer = CampaignProviderRequestSerializer(
             data, context={'request': request}
@@ -107,31 +135,51 @@ class InformationObjectViewSet(mixins.CreateModelMixin,
 
     @action(detail=False, methods=['post'])
     def report(self, request):
-        questionaire_id = int(request.data.get('questionaire'))
-        iobj_id = int(request.data.get('informationObject'))
-        answers = request.data.get('answers')
+        try:
+            questionaire_id = int(request.data.get('questionaire'))
+            iobj_id = int(request.data.get('informationObject'))
+            answers = {
+                int(answer['questionId']): answer['answer']
+                for answer in request.data.get('answers') or []
+            }
+        except (ValueError, TypeError, KeyError):
+            return Response({
+                'error': 'Invalid report'
+            }, status=400)
         report_id = request.data.get('report')
 
-        questionaire = Questionaire.objects.get(id=questionaire_id)
-        information_object = InformationObject.objects.get(id=iobj_id)
+        question_count = Question.objects.filter(
+            questionaire_id=questionaire_id,
+            id__in=answers.keys()
+        ).count()
+        if question_count != len(answers):
+            return Response({
+                'error': 'Invalid question'
+            }, status=400)
 
-        if report_id:
-            report = Report.objects.get(id=report_id)
-            report.answer_set.all().delete()
-        else:
-            report = Report.objects.create(
-                questionaire=questionaire,
-                informationsobject=information_object
-            )
+        try:
+            with transaction.atomic():
+                if report_id:
+                    report = Report.objects.select_for_update().get(
+                        id=report_id,
+                        questionaire_id=questionaire_id,
+                        informationsobject_id=iobj_id
+                    )
+                else:
+                    report = Report.objects.create(
+                        questionaire_id=questionaire_id,
+                        informationsobject_id=iobj_id
+                    )
+                report.save_answers(answers)
+                # Answers are saved in bulk without signals
+                transaction.on_commit(
+                    lambda: bump_questionaire_version(questionaire_id)
+                )
+        except (Report.DoesNotExist, IntegrityError):
+            return Response({
+                'error': 'Invalid report'
+            }, status=400)
 
-        for answer in answers:
-            question_id = int(answer['questionId'])
-            question = Question.objects.get(id=question_id)
-            Answer.objects.create(
-                text=answer['answer'],
-                report=report,
-                question=question
-            )
         return Response({
             'report': report.id
         })
@@ -147,26 +195,89 @@ class InformationObjectViewSet(mixins.CreateModelMixin,
 
         if email and campaign_id:
             try:
-                campaign = Campaign.objects.get(id=campaign_id)
-                if subscribe:
-                    obj, created = CampaignSubscription.objects.get_or_create(
-                        campaign=campaign, email=email)
-                    return Response({
-                        'email': obj.email,
-                        'campaign': obj.campaign.id
-                    })
-                else:
-                    try:
-                        obj = CampaignSubscription.objects.get(
-                            campaign=campaign, email=email).delete()
-                    except CampaignSubscription.DoesNotExist:
-                        pass
-            except Campaign.DoesNotExist:
+                campaign_id = int(campaign_id)
+            except (ValueError, TypeError):
+                campaign_id = None
+            if campaign_id is None or not Campaign.objects.filter(
+                    id=campaign_id).exists():
                 return Response({
                     'error': 'Campaign does not exist'
                 })
+            if subscribe:
+                CampaignSubscription.objects.subscribe(campaign_id, email)
+            else:
+                CampaignSubscription.objects.unsubscribe(campaign_id, email)
+            if subscribe:
+                return Response({
+                    'email': email,
+                    'campaign': campaign_id
+                })
         return Response({})
 
+    @action(detail=False, methods=['get'])
+    def questionaire(self, request):
+        try:
+            questionaire_id = int(request.GET.get('questionaire'))
+        except (ValueError, TypeError):
+            raise Http404
+        questionaire = get_object_or_404(
+            Questionaire.objects.select_related('campaign'),
+            id=questionaire_id, campaign__public=True
+        )
+        try:
+            after = int(request.GET['after'])
+        except (KeyError, ValueError):
+            after = None
+
+        cache_key = make_cache_key(
+            'questionaire', questionaire.id,
+            get_campaign_version(questionaire.campaign_id),
+            get_questionaire_version(questionaire.id), after
+        )
+        result = cache.get(cache_key)
+        record_cache_lookup('questionaire', result is not None)
+        if result is None:
+            data, has_more = get_questionaire_objects(
+                questionaire, after=after
+            )
+            result = {
+                'results': data,
+                'has_more': has_more
+            }
+            cache.set(cache_key, result, QUESTIONAIRE_CACHE_TIMEOUT)
+
+        response = Response(result)
+        patch_cache_control(
+            response, public=True, max_age=QUESTIONAIRE_CACHE_TIMEOUT
+        )
+        return response
+
+    @action(detail=False, methods=['get'])
+    def progress(self, request):
+        campaign = get_object_or_404(
+            Campaign.objects.get_public(),
+            id=request.GET.get('campaign')
+        )
+        try:
+            end = parse_date(request.GET.get('end') or '') or (
+                timezone.localdate()
+            )
+            start = parse_date(request.GET.get('start') or '') or (
+                end - timedelta(days=PROGRESS_DEFAULT_DAYS)
+            )
+        except ValueError:
+            start, end = None, None
+        if start is None or start > end or (
+                (end - start).days > PROGRESS_MAX_DAYS):
+            return Response({
+                'error': 'Invalid date range'
+            }, status=400)
+
+        progress = CampaignProgress.objects.filter(
+            campaign=campaign, date__range=(start, end)
+        ).order_by('date').values(*PROGRESS_FIELDS)
+        return Response(list(progress))
+
     @action(detail=False, methods=['get'])
     def random(self, request):
         campaign_id = request.GET.get('campaign')
@@ -196,7 +307,7 @@ class InformationObjectViewSet(mixins.CreateModelMixin,
         provider = campaign.get_provider()
 
         filters = {
-            'q': request.GET.get('q', ''),
+            'q': request.GET.get('q', '').strip(),
             'limit': request.GET.get('limit', '')
         }
 
@@ -220,6 +331,11 @@ class InformationObjectViewSet(mixins.CreateModelMixin,
         except ValueError:
             pass
 
+        try:
+            filters['bbox'] = get_bbox(request)
+        except ValueError:
+            pass
+
         try:
             filters['zoom'] = int(request.GET.get('zoom'))
         except (ValueError, TypeError):
@@ -229,7 +345,8 @@ class InformationObjectViewSet(mixins.CreateModelMixin,
         except (ValueError, TypeError):
             pass
 
-        data = provider.search(**filters)
+        with measure_latency('search_latency', provider.__class__.__name__):
+            data = provider.search(**filters)
 
         if not type(provider) == BaseProvider:
             iobjs = BaseProvider(campaign).search(**filters)
@@ -10,10 +10,51 @@ class FroideCampaignConfig(AppConfig):
     verbose_name = _("Froide Campaign App")
 
     def ready(self):
-        from .listeners import connect_info_object
-
+        from django.db.models.signals import (post_save, post_delete,
+                                              m2m_changed)
         from froide.foirequest.models import FoiRequest
+        from froide.publicbody.models import Category, Classification
+        from froide.georegion.models import GeoRegion
+
+        from .cache import (bump_tree_version, bump_index_version,
+                            campaign_version_bumped)
+        from .listeners import (connect_info_object, bump_request_campaigns,
+                                bump_campaign, bump_object_campaign,
+                                bump_questionaire, bump_linked_campaigns,
+                                schedule_embed_updates)
+        from .models import (Campaign, CampaignPage, InformationObject,
+                             Questionaire, Question, Report)
+        from .providers import load_provider_classes, invalidate_provider
+
         FoiRequest.request_created.connect(connect_info_object)
+        FoiRequest.status_changed.connect(bump_request_campaigns)
+
+        for model in (Category, Classification, GeoRegion):
+            post_save.connect(bump_tree_version, sender=model)
+            post_delete.connect(bump_tree_version, sender=model)
+
+        load_provider_classes()
+        post_save.connect(invalidate_provider, sender=Campaign)
+        post_delete.connect(invalidate_provider, sender=Campaign)
+
+        post_save.connect(bump_campaign, sender=Campaign)
+        for model in (InformationObject, Questionaire):
+            post_save.connect(bump_object_campaign, sender=model)
+            post_delete.connect(bump_object_campaign, sender=model)
+        for model in (Question, Report):
+            post_save.connect(bump_questionaire, sender=model)
+            post_delete.connect(bump_questionaire, sender=model)
+        m2m_changed.connect(
+            bump_linked_campaigns,
+            sender=InformationObject.foirequests.through
+        )
+        campaign_version_bumped.connect(schedule_embed_updates)
+
+        post_save.connect(bump_index_version, sender=CampaignPage)
+        post_delete.connect(bump_index_version, sender=CampaignPage)
+        m2m_changed.connect(
+            bump_index_version, sender=CampaignPage.campaigns.through
+        )
 
         from froide.account.menu import menu_registry, MenuItem
         from froide.account.export import registry
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db import models
+from django.dispatch import Signal
+
+CACHE_PREFIX = 'froide_campaign'
+
+campaign_version_bumped = Signal()
+
+
+def make_cache_key(*parts):
+    return ':'.join([CACHE_PREFIX] + [str(p) for p in parts])
+
+
+def get_instance_version(value):
+    if isinstance(value, models.Model):
+        return [
+            value._meta.label, value.pk,
+            getattr(value, 'updated_at', None)
+        ]
+    return str(value)
+
+
+def make_hash(value):
+    serialized = json.dumps(
+        value, sort_keys=True, default=get_instance_version
+    )
+    return hashlib.md5(serialized.encode('utf-8')).hexdigest()
+
+
+def get_version(name):
+    '''
+    Returns the current version of `name`. Versions are millisecond
+    timestamps so they double as a last modified date.
+    '''
+    key = make_cache_key('version', name)
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(name):
+    key = make_cache_key('version', name)
+    version = max(int(time.time() * 1000), (cache.get(key) or 0) + 1)
+    cache.set(key, version, None)
+    return version
+
+
+TREE_VERSION = 'publicbody_tree'
+
+
+def get_tree_version():
+    return get_version(TREE_VERSION)
+
+
+def bump_tree_version(sender, **kwargs):
+    bump_version(TREE_VERSION)
+
+
+INDEX_VERSION = 'campaign_index'
+
+
+def get_index_version():
+    return get_version(INDEX_VERSION)
+
+
+def bump_index_version(sender, **kwargs):
+    bump_version(INDEX_VERSION)
+
+
+def get_campaign_version_name(campaign_id):
+    return 'campaign:%s' % campaign_id
+
+
+def get_campaign_versions(campaign_ids):
+    """
+    Returns the versions of all given campaigns with one get_many,
+    only missing versions are added individually.
+    """
+    keys = {
+        campaign_id: make_cache_key(
+            'version', get_campaign_version_name(campaign_id)
+        )
+        for campaign_id in campaign_ids
+    }
+    cached = cache.get_many(list(keys.values()))
+    return {
+        campaign_id: (
+            cached[key] if key in cached
+            else get_version(get_campaign_version_name(campaign_id))
+        )
+        for campaign_id, key in keys.items()
+    }
+
+
+def get_campaign_version(campaign_id):
+    return get_version(get_campaign_version_name(campaign_id))
+
+
+def bump_campaign_version(campaign_id):
+    version = bump_version(get_campaign_version_name(campaign_id))
+    campaign_version_bumped.send(
+        sender=None, campaign_id=campaign_id, version=version
+    )
+    return version
+
+
+def get_questionaire_version_name(questionaire_id):
+    return 'questionaire:%s' % questionaire_id
+
+
+def get_questionaire_version(questionaire_id):
+    return get_version(get_questionaire_version_name(questionaire_id))
+
+
+def bump_questionaire_version(questionaire_id):
+    return bump_version(get_questionaire_version_name(questionaire_id))
+
+
+def get_campaign_page_version(campaign_page):
+    campaign_ids = sorted(
+        campaign_page.campaigns.all().values_list('id', flat=True)
+    )
+    versions = get_campaign_versions(campaign_ids)
+    return make_hash(sorted(versions.items()))
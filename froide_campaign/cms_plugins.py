@@ -1,13 +1,16 @@
 import json
 import logging
 
+from django.core.cache import cache
+from django.template.loader import render_to_string
 from django.templatetags.static import static
+from django.utils import translation
+from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
 from cms.plugin_base import CMSPluginBase
 from cms.plugin_pool import plugin_pool
 
-from froide.foirequest.models.request import Resolution
 from froide.foirequest.views import MakeRequestView
 
 from .models import (CampaignRequestsCMSPlugin,
@@ -16,18 +19,58 @@ from .models import (CampaignRequestsCMSPlugin,
                      CampaignCMSPlugin,
                      CampaignQuestionaireCMSPlugin)
 
-from .serializers import InformationObjectSerializer
-from .providers import BaseProvider
-
-try:
-    from django.contrib.gis.geoip2 import GeoIP2
-except ImportError:
-    GeoIP2 = None
+from .cache import (make_cache_key, make_hash, get_campaign_version,
+                    get_campaign_page_version, get_questionaire_version)
+from .geoip import get_city
+from .metrics import record_cache_lookup
+from .utils import get_questionaire_objects
 
 from froide.helper.utils import get_client_ip
 
 logger = logging.getLogger(__name__)
 
+REQUESTS_CACHE_TIMEOUT = 60 * 60
+REQUEST_CONTEXT_CACHE_TIMEOUT = 60 * 60
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+
+class FragmentCacheMixin:
+    '''
+    Renders the plugin's markup from `fragment_template` and caches
+    it under a key that contains the campaign content version.
+    '''
+    fragment_template = None
+
+    def get_fragment_cache_key(self, request, instance):
+        return None
+
+    def get_fragment_context(self, request, instance):
+        return {}
+
+    def render_fragment(self, request, instance):
+        cache_key = self.get_fragment_cache_key(request, instance)
+        if cache_key is not None:
+            fragment = cache.get(cache_key)
+            record_cache_lookup('fragment', fragment is not None)
+            if fragment is not None:
+                return mark_safe(fragment)
+
+        fragment = render_to_string(
+            self.fragment_template,
+            self.get_fragment_context(request, instance),
+            request=request
+        )
+        if cache_key is not None:
+            cache.set(cache_key, fragment, FRAGMENT_CACHE_TIMEOUT)
+        return fragment
+
+    def render(self, context, instance, placeholder):
+        context = super().render(context, instance, placeholder)
+        context.update({
+            'fragment': self.render_fragment(context.get('request'), instance)
+        })
+        return context
+
 
 @plugin_pool.register_plugin
 class CampaignRequestsPlugin(CMSPluginBase):
@@ -38,28 +81,44 @@ class CampaignRequestsPlugin(CMSPluginBase):
 
     def render(self, context, instance, placeholder):
         context = super().render(context, instance, placeholder)
+        context.update({
+            'iobjs': self.get_information_objects(instance)
+        })
+        return context
+
+    def get_information_objects(self, instance):
+        cache_key = make_cache_key(
+            'campaign_requests', instance.pk,
+            get_campaign_page_version(instance.campaign_page),
+            instance.limit, instance.ordering
+        )
+        iobjs = cache.get(cache_key)
+        record_cache_lookup('campaign_requests', iobjs is not None)
+        if iobjs is not None:
+            return iobjs
+
         campaigns = instance.campaign_page.campaigns.all()
         iobjs = InformationObject.objects.filter(
             campaign__in=campaigns,
             foirequest__isnull=False
-        ).select_related('foirequest')
-        context.update({
-            'iobjs': iobjs
-        })
-        return context
+        ).select_related('foirequest').order_by(instance.ordering, 'id')
+        if instance.limit:
+            iobjs = iobjs[:instance.limit]
+        iobjs = list(iobjs)
+        cache.set(cache_key, iobjs, REQUESTS_CACHE_TIMEOUT)
+        return iobjs
+
 
 @plugin_pool.register_plugin
-class CampaignPlugin(CMSPluginBase):
+class CampaignPlugin(FragmentCacheMixin, CMSPluginBase):
     module = _("Campaign")
     name = _("Campaign Map")
     render_template = "froide_campaign/plugins/campaign_map.html"
+    fragment_template = "froide_campaign/plugins/_campaign_map.html"
     model = CampaignCMSPlugin
     cache = False
 
     def get_city_from_request(self, request):
-        if GeoIP2 is None:
-            return
-
         ip = get_client_ip(request)
         if not ip:
             logger.warning('No IP found on request: %s', request)
@@ -68,21 +127,11 @@ class CampaignPlugin(CMSPluginBase):
             # Access via localhost
             return
 
-        try:
-            g = GeoIP2()
-        except Exception as e:
-            logger.exception(e)
-            return
-        try:
-            result = g.city(ip)
-        except Exception as e:
-            logger.exception(e)
-            return
+        result = get_city(ip)
         if result and result.get('latitude'):
             return result
 
-    def get_map_config(self, request, instance):
-        city = self.get_city_from_request(request)
+    def get_map_config(self, request, instance, city=None):
         campaign_id = instance.campaign.id
         law_type = None
 
@@ -110,42 +159,78 @@ class CampaignPlugin(CMSPluginBase):
         })
         return plugin_settings
 
-    def render(self, context, instance, placeholder):
-
-        context = super().render(context, instance, placeholder)
-        request = context.get('request')
+    def get_request_context(self, request):
         fake_make_request_view = MakeRequestView(request=request)
-
-        context.update({
-            'config': json.dumps(self.get_map_config(request, instance)),
+        return {
             'request_config': json.dumps(
                 fake_make_request_view.get_js_context()),
-            'request_form': fake_make_request_view.get_form(),
-            'user_form': fake_make_request_view.get_user_form()
-        })
+            'request_form': fake_make_request_view.get_form().as_json(),
+            'user_form': fake_make_request_view.get_user_form().as_json()
+        }
+
+    def get_anonymous_request_context(self, request, instance):
+        cache_key = make_cache_key(
+            'map_request_context', instance.campaign_id,
+            translation.get_language()
+        )
+        request_context = cache.get(cache_key)
+        record_cache_lookup('map_request_context', request_context is not None)
+        if request_context is None:
+            request_context = self.get_request_context(request)
+            cache.set(
+                cache_key, request_context, REQUEST_CONTEXT_CACHE_TIMEOUT
+            )
+        return request_context
+
+    def get_fragment_cache_key(self, request, instance):
+        if request.user.is_authenticated or request.GET:
+            return None
+        city = self.get_city_from_request(request)
+        return make_cache_key(
+            'map_plugin', instance.pk,
+            get_campaign_version(instance.campaign_id),
+            translation.get_language(), make_hash(city)
+        )
+
+    def get_fragment_context(self, request, instance):
+        city = self.get_city_from_request(request)
+        if request.user.is_authenticated or request.GET:
+            request_context = self.get_request_context(request)
+        else:
+            request_context = self.get_anonymous_request_context(
+                request, instance
+            )
+
+        context = {
+            'config': json.dumps(
+                self.get_map_config(request, instance, city=city)
+            ),
+        }
+        context.update(request_context)
         return context
 
 
 @plugin_pool.register_plugin
-class CampaignQuestionairePlugin(CMSPluginBase):
+class CampaignQuestionairePlugin(FragmentCacheMixin, CMSPluginBase):
     module = _("Campaign")
     name = _("Campaign Questionaire")
     render_template = "froide_campaign/plugins/campaign_questionaire.html"
+    fragment_template = (
+        "froide_campaign/plugins/_campaign_questionaire.html"
+    )
     model = CampaignQuestionaireCMSPlugin
     cache = False
 
-    def render(self, context, instance, placeholder):
-        context = super().render(context, instance, placeholder)
-        iobjs = instance.questionaire.campaign.informationobject_set.all()
-
-        iobjs_success = iobjs.filter(
-            report__isnull=True,
-            foirequests__resolution=Resolution.SUCCESSFUL)
+    def get_fragment_cache_key(self, request, instance):
+        return make_cache_key(
+            'questionaire_plugin', instance.pk,
+            get_campaign_version(instance.questionaire.campaign_id),
+            get_questionaire_version(instance.questionaire_id),
+            translation.get_language()
+        )
 
-        provider = BaseProvider(campaign=instance.questionaire.campaign)
-        mapping = provider.get_foirequests_mapping(iobjs_success)
-        data = [provider.get_provider_item_data(obj, foirequests=mapping)
-                for obj in iobjs_success]
+    def get_fragment_context(self, request, instance):
+        data, has_more = get_questionaire_objects(instance.questionaire)
 
         questions = [{'text': question.text,
                       'id': question.id,
@@ -156,16 +241,16 @@ class CampaignQuestionairePlugin(CMSPluginBase):
                      for question in instance.questionaire.question_set.all()]
 
         config = {
-            'viewerUrl': static('filingcabinet/viewer/web/viewer.html')
+            'viewerUrl': static('filingcabinet/viewer/web/viewer.html'),
+            'hasMore': has_more
         }
 
-        context.update({
+        return {
             'questionaire': instance.questionaire.id,
             'informationobjects': json.dumps(data),
             'questions': json.dumps(questions),
             'config': json.dumps(config)
-        })
-        return context
+        }
 
 
 @plugin_pool.register_plugin
@@ -8,6 +8,8 @@ from froide.georegion.models import GeoRegion
 
 import geocoder
 
+from .metrics import incr_metric
+
 logger = logging.getLogger()
 
 API_KEY = settings.FROIDE_FOOD_CONFIG.get('api_key_geocode_here')
@@ -44,6 +46,7 @@ def get_reverse_kwargs():
 
 def run_geocode(search, country='DE', address=True):
     kwargs = get_kwargs()
+    incr_metric('geocode', 'forward', 'call')
     try:
         result = geocoder.mapbox(search, **kwargs)
         latlng = None
@@ -62,11 +65,13 @@ def run_geocode(search, country='DE', address=True):
         return latlng, address
     except Exception as e:
         logger.exception(e)
+        incr_metric('geocode', 'forward', 'failure')
         return None
 
 
 def reverse_geocode(latlng):
     kwargs = get_reverse_kwargs()
+    incr_metric('geocode', 'reverse', 'call')
     try:
         result = geocoder.mapbox(latlng, method='reverse', **kwargs)
         if len(result) == 0:
@@ -78,6 +83,7 @@ def reverse_geocode(latlng):
         return None
     except Exception as e:
         logger.exception(e)
+        incr_metric('geocode', 'reverse', 'failure')
         return None
 
 
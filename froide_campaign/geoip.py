@@ -0,0 +1,68 @@
+import functools
+import ipaddress
+import logging
+import threading
+
+from django.conf import settings
+
+try:
+    from django.contrib.gis.geoip2 import GeoIP2
+except ImportError:
+    GeoIP2 = None
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_CACHE_SIZE = 10000
+IPV4_PREFIX = 24
+IPV6_PREFIX = 48
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_reader():
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                try:
+                    _reader = GeoIP2()
+                except Exception as e:
+                    logger.exception(e)
+                    _reader = False
+    return _reader or None
+
+
+def get_ip_prefix(ip):
+    '''
+    Returns the network address of the IP's /24 (IPv4) or /48 (IPv6)
+    network, which is precise enough for a city lookup.
+    '''
+    ip = ipaddress.ip_address(ip)
+    prefix = IPV4_PREFIX if ip.version == 4 else IPV6_PREFIX
+    network = ipaddress.ip_network('%s/%d' % (ip, prefix), strict=False)
+    return str(network.network_address)
+
+
+@functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def lookup_city(ip_prefix):
+    reader = get_reader()
+    if reader is None:
+        return None
+    try:
+        return reader.city(ip_prefix)
+    except Exception as e:
+        logger.info(e)
+        return None
+
+
+def get_city(ip):
+    if GeoIP2 is None:
+        return None
+    if not getattr(settings, 'CAMPAIGN_GEOIP_ENABLED', True):
+        return None
+    try:
+        ip_prefix = get_ip_prefix(ip)
+    except ValueError:
+        return None
+    return lookup_city(ip_prefix)
@@ -1,27 +1,75 @@
-from .models import Campaign
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .cache import (make_cache_key, bump_campaign_version,
+                    bump_questionaire_version)
+from .utils import (parse_reference, connect_foirequests,
+                    queue_connect_foirequest, schedule_embed_update,
+                    EMBED_UPDATE_DELAY)
+
+CONNECT_DEDUP_TIMEOUT = 60 * 60
 
 
 def connect_info_object(sender, **kwargs):
-    reference = kwargs.get('reference')
-    if not reference:
+    parsed = parse_reference(kwargs.get('reference'))
+    if parsed is None:
         return
-    if not reference.startswith('campaign:'):
+    campaign_pk, ident = parsed
+
+    if getattr(settings, 'CAMPAIGN_CONNECT_EAGER', False):
+        connect_foirequests([(sender, campaign_pk, ident)])
         return
-    namespace, campaign_value = reference.split(':', 1)
-    try:
-        campaign, ident = campaign_value.split('@', 1)
-    except (ValueError, IndexError):
+
+    dedup_key = make_cache_key('connect', sender.id)
+    if not cache.add(dedup_key, True, CONNECT_DEDUP_TIMEOUT):
         return
 
-    try:
-        campaign_pk = int(campaign)
-    except ValueError:
+    item = (sender.id, campaign_pk, ident)
+    transaction.on_commit(lambda: queue_connect_foirequest(item))
+
+
+def bump_request_campaigns(sender, **kwargs):
+    campaign_ids = sender.information_objects.values_list(
+        'campaign_id', flat=True
+    ).distinct()
+    for campaign_id in campaign_ids:
+        bump_campaign_version(campaign_id)
+
+
+def bump_campaign(sender, instance=None, **kwargs):
+    bump_campaign_version(instance.id)
+
+
+def bump_object_campaign(sender, instance=None, **kwargs):
+    bump_campaign_version(instance.campaign_id)
+
+
+def bump_questionaire(sender, instance=None, **kwargs):
+    bump_questionaire_version(instance.questionaire_id)
+
+
+def bump_linked_campaigns(sender, instance=None, action=None, reverse=False,
+                          pk_set=None, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_campaign_version(instance.campaign_id)
         return
+    bump_request_campaigns(instance)
+
+
+def schedule_embed_updates(sender, campaign_id=None, **kwargs):
+    from .models import CampaignPage
 
-    try:
-        campaign = Campaign.objects.get(pk=campaign_pk)
-    except Campaign.DoesNotExist:
+    # Builds run after EMBED_UPDATE_DELAY and pick up all changes until
+    # then, so the pages only need to be looked up once per window
+    if not cache.add(make_cache_key('embed_campaign', campaign_id), True,
+                     EMBED_UPDATE_DELAY):
         return
 
-    provider = campaign.get_provider()
-    provider.connect_request(ident, sender)
+    campaign_pages = CampaignPage.objects.filter(
+        campaigns=campaign_id
+    ).exclude(embed='')
+    for campaign_page in campaign_pages:
+        schedule_embed_update(campaign_page)
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.utils import translation
+from django.conf import settings
+
+from froide.foirequest.models import FoiRequest
+
+from ...utils import parse_reference, connect_foirequests
+
+
+class Command(BaseCommand):
+    help = "Links campaign requests that are missing their information object"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', default=False)
+
+    def handle(self, *args, **options):
+        translation.activate(settings.LANGUAGE_CODE)
+
+        reference = 'campaign:'
+        if options['campaign'] is not None:
+            reference = 'campaign:%s@' % options['campaign']
+
+        foirequests = FoiRequest.objects.filter(
+            reference__startswith=reference,
+            information_objects__isnull=True
+        ).select_related('public_body').order_by('id')
+
+        batch_size = options['batch_size']
+        found, linked = 0, 0
+        batch = []
+        for foirequest in foirequests.iterator(chunk_size=batch_size):
+            parsed = parse_reference(foirequest.reference)
+            if parsed is None:
+                continue
+            found += 1
+            batch.append((foirequest,) + parsed)
+            if len(batch) >= batch_size:
+                linked += self.link(batch, options['dry_run'])
+                batch = []
+        if batch:
+            linked += self.link(batch, options['dry_run'])
+
+        self.stdout.write(
+            'Found %d unlinked campaign requests, linked %d.' % (
+                found, linked
+            )
+        )
+
+    def link(self, batch, dry_run):
+        if dry_run:
+            return 0
+        return connect_foirequests(batch)
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone, translation
+from django.utils.dateparse import parse_date
+from django.conf import settings
+
+from ...models import Campaign, CampaignProgress
+
+
+class Command(BaseCommand):
+    help = "Fills daily campaign progress, by default for yesterday"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, default=None)
+        parser.add_argument('--start', type=str, default=None,
+                            help='First day to fill (YYYY-MM-DD)')
+        parser.add_argument('--end', type=str, default=None,
+                            help='Last day to fill (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        translation.activate(settings.LANGUAGE_CODE)
+
+        yesterday = timezone.localdate() - timedelta(days=1)
+        end = self.get_date(options['end'], yesterday)
+        start = self.get_date(options['start'], end)
+        if start > end:
+            raise CommandError('Start must not be after end')
+
+        campaigns = Campaign.objects.all()
+        if options['campaign'] is not None:
+            campaigns = campaigns.filter(id=options['campaign'])
+
+        for campaign in campaigns:
+            count = CampaignProgress.objects.update_range(
+                campaign, start, end, count_locations=end >= yesterday
+            )
+            self.stdout.write('%s: %d days' % (campaign, count))
+
+    def get_date(self, value, default):
+        if value is None:
+            return default
+        date = parse_date(value)
+        if date is None:
+            raise CommandError('Invalid date: %s' % value)
+        return date
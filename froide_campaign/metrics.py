@@ -0,0 +1,165 @@
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .cache import make_cache_key
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CACHE_NAMES = (
+    'questionaire', 'campaign_requests', 'map_request_context',
+    'fragment', 'stats'
+)
+GEOCODE_METHODS = ('forward', 'reverse')
+
+# Durations are accumulated as integer microseconds so they can use incr
+MICROSECONDS = 1000 * 1000
+
+
+def get_metric_key(name, *labels):
+    return make_cache_key('metrics', name, *labels)
+
+
+def incr_metric(name, *labels, amount=1):
+    key = get_metric_key(name, *labels)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, None):
+            cache.incr(key, amount)
+
+
+def decr_metric(name, *labels, amount=1):
+    try:
+        cache.decr(get_metric_key(name, *labels), amount)
+    except ValueError:
+        pass
+
+
+def observe_latency(name, label, seconds):
+    '''
+    Counts the observation only in its own bucket, buckets are made
+    cumulative on export. That keeps an observation at three cache calls.
+    '''
+    bucket = next(
+        (str(le) for le in LATENCY_BUCKETS if seconds <= le), '+Inf'
+    )
+    incr_metric(name, label, 'bucket', bucket)
+    incr_metric(name, label, 'count')
+    incr_metric(name, label, 'sum', amount=int(seconds * MICROSECONDS))
+
+
+@contextmanager
+def measure_latency(name, label):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe_latency(name, label, time.monotonic() - start)
+
+
+def record_cache_lookup(cache_name, hit):
+    incr_metric('cache', cache_name, 'hit' if hit else 'miss')
+
+
+def format_labels(**labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '{}="{}"'.format(
+            key, str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for key, value in labels.items()
+    )
+
+
+def format_metric(lines, name, value, **labels):
+    lines.append('{}{} {}'.format(name, format_labels(**labels), value))
+
+
+def get_campaign_lines(lines):
+    from .models import InformationObject
+
+    counts = InformationObject.objects.values('campaign_id').annotate(
+        object_count=Count('id', distinct=True),
+        request_count=Count('foirequests', distinct=True)
+    ).order_by()
+    counts = list(counts)
+
+    # Samples of a metric family have to follow its TYPE line
+    for metric, field in (('froide_campaign_objects', 'object_count'),
+                          ('froide_campaign_requests', 'request_count')):
+        lines.append('# TYPE {} gauge'.format(metric))
+        for row in counts:
+            format_metric(lines, metric, row[field],
+                          campaign=row['campaign_id'])
+
+
+def get_histogram_lines(lines, name, label_name, label_values):
+    keys = {}
+    for value in label_values:
+        for le in [str(le) for le in LATENCY_BUCKETS] + ['+Inf']:
+            keys[(value, le)] = get_metric_key(name, value, 'bucket', le)
+        keys[(value, 'count')] = get_metric_key(name, value, 'count')
+        keys[(value, 'sum')] = get_metric_key(name, value, 'sum')
+    values = cache.get_many(list(keys.values()))
+
+    metric = 'froide_campaign_{}_seconds'.format(name)
+    lines.append('# TYPE {} histogram'.format(metric))
+    for value in label_values:
+        cumulative = 0
+        for le in [str(le) for le in LATENCY_BUCKETS] + ['+Inf']:
+            cumulative += values.get(keys[(value, le)], 0)
+            format_metric(lines, metric + '_bucket', cumulative,
+                          **{label_name: value, 'le': le})
+        format_metric(lines, metric + '_count',
+                      values.get(keys[(value, 'count')], 0),
+                      **{label_name: value})
+        format_metric(lines, metric + '_sum',
+                      values.get(keys[(value, 'sum')], 0) / MICROSECONDS,
+                      **{label_name: value})
+
+
+def get_counter_lines(lines, metric, name, label_name, label_values,
+                      suffixes, suffix_name, kind='counter'):
+    keys = {
+        (value, suffix): get_metric_key(name, value, suffix)
+        for value in label_values
+        for suffix in suffixes
+    }
+    values = cache.get_many(list(keys.values()))
+    lines.append('# TYPE {} {}'.format(metric, kind))
+    for (value, suffix), key in keys.items():
+        format_metric(lines, metric, values.get(key, 0),
+                      **{label_name: value, suffix_name: suffix})
+
+
+def get_provider_class_names():
+    from .providers import PROVIDER_CLASS_CACHE, BaseProvider
+
+    return sorted({
+        klass.__name__
+        for klass in list(PROVIDER_CLASS_CACHE.values()) + [BaseProvider]
+    })
+
+
+def export_metrics():
+    lines = []
+    get_campaign_lines(lines)
+    get_histogram_lines(
+        lines, 'search_latency', 'provider', get_provider_class_names()
+    )
+    get_counter_lines(
+        lines, 'froide_campaign_cache_lookups_total', 'cache', 'cache',
+        CACHE_NAMES, ('hit', 'miss'), 'result'
+    )
+    get_counter_lines(
+        lines, 'froide_campaign_geocode_total', 'geocode', 'method',
+        GEOCODE_METHODS, ('call', 'failure'), 'result'
+    )
+    queue_depth = cache.get(get_metric_key('connect_queue')) or 0
+    lines.append('# TYPE froide_campaign_connect_queue_depth gauge')
+    format_metric(lines, 'froide_campaign_connect_queue_depth', queue_depth)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('froide_campaign', '0029_auto_20201027_1134'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            '''
+            DELETE FROM froide_campaign_campaignsubscription a
+            USING froide_campaign_campaignsubscription b
+            WHERE a.campaign_id = b.campaign_id
+            AND a.email = b.email
+            AND a.id > b.id
+            ''',
+            migrations.RunSQL.noop
+        ),
+        migrations.AlterUniqueTogether(
+            name='campaignsubscription',
+            unique_together={('campaign', 'email')},
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('froide_campaign', '0030_campaignsubscription_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignrequestscmsplugin',
+            name='limit',
+            field=models.PositiveIntegerField(default=20, help_text='Maximum number of requests shown, 0 for all'),
+        ),
+        migrations.AddField(
+            model_name='campaignrequestscmsplugin',
+            name='ordering',
+            field=models.CharField(choices=[('-foirequest__first_message', 'Newest requests first'), ('foirequest__first_message', 'Oldest requests first'), ('title', 'Title')], default='-foirequest__first_message', max_length=50),
+        ),
+    ]
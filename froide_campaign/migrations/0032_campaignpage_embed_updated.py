@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('froide_campaign', '0031_campaignrequestscmsplugin_limit_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignpage',
+            name='embed_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
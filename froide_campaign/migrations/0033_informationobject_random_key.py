@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+import froide_campaign.models.campaign
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('froide_campaign', '0032_campaignpage_embed_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='informationobject',
+            name='random_key',
+            field=models.FloatField(
+                db_index=True,
+                default=froide_campaign.models.campaign.get_random_key,
+                editable=False
+            ),
+        ),
+        migrations.RunSQL(
+            'UPDATE froide_campaign_informationobject '
+            'SET random_key = random();',
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('froide_campaign', '0033_informationobject_random_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('request_count', models.PositiveIntegerField(default=0)),
+                ('new_request_count', models.PositiveIntegerField(default=0)),
+                ('resolved_count', models.PositiveIntegerField(default=0)),
+                ('new_resolved_count', models.PositiveIntegerField(default=0)),
+                ('location_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('new_location_count', models.IntegerField(blank=True, null=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='froide_campaign.Campaign')),
+            ],
+            options={
+                'verbose_name': 'Campaign progress',
+                'verbose_name_plural': 'Campaign progress',
+                'ordering': ('campaign', 'date'),
+                'unique_together': {('campaign', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('froide_campaign', '0034_campaignprogress'),
+        ('publicbody', '__first__'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS froide_campaign_publicbody_search "
+            "ON publicbody_publicbody USING gin (("
+            "setweight(to_tsvector('simple'::regconfig, "
+            "COALESCE(name, '')), 'A') || "
+            "setweight(to_tsvector('simple'::regconfig, "
+            "COALESCE(other_names, '')), 'B')));",
+            "DROP INDEX IF EXISTS froide_campaign_publicbody_search;"
+        ),
+    ]
@@ -1,9 +1,12 @@
 import functools
 import json
+import random
+from datetime import timedelta
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
 from django.contrib.gis.db import models as gis_models
 from django.urls import reverse
 from django.utils.safestring import mark_safe
@@ -23,6 +26,14 @@ from froide.helper.csv_utils import export_csv
 from froide_campaign.storage import OverwriteStorage
 
 
+def make_prefix_tsquery(value):
+    """
+    Turns 'Foobar Baz' into the tsquery text 'Foobar':* & 'Baz':*
+    """
+    parts = (s.replace("'", '') for s in value.split())
+    return ' & '.join("'%s':*" % s for s in parts if s)
+
+
 class SearchVectorStartsWith(SearchVectorExact):
     """This lookup scans for full text index entries that BEGIN with
     a given phrase, like:
@@ -39,8 +50,7 @@ class SearchVectorStartsWith(SearchVectorExact):
             qn, connection
         )
         rhs = '(to_tsquery(%s::regconfig, %s))'
-        parts = (s.replace("'", '') for s in rhs_params[1].split())
-        rhs_params[1] = ' & '.join("'%s':*" % s for s in parts if s)
+        rhs_params[1] = make_prefix_tsquery(rhs_params[1])
         return rhs, rhs_params
 
     def as_sql(self, qn, connection):
@@ -53,8 +63,12 @@ class SearchVectorStartsWith(SearchVectorExact):
 SearchVectorField.register_lookup(SearchVectorStartsWith)
 
 
+def get_random_key():
+    return random.random()
+
+
 def get_embed_path(instance, filename):
-    return 'campaign/page/embed/{0}/index.html'.format(instance.slug)
+    return 'campaign/page/embed/{0}/{1}'.format(instance.slug, filename)
 
 
 class CampaignPage(models.Model):
@@ -79,6 +93,7 @@ class CampaignPage(models.Model):
         blank=True, upload_to=get_embed_path,
         storage=OverwriteStorage()
     )
+    embed_updated = models.DateTimeField(null=True, blank=True)
 
     campaigns = models.ManyToManyField('Campaign')
 
@@ -111,12 +126,18 @@ class CampaignPage(models.Model):
             str(self.id)
         )
 
-    def get_embed_iframe(self):
-        if not self.embed:
-            return ''
+    def get_embed_file_url(self):
         url = self.embed.url
         if not url.startswith('http'):
             url = settings.SITE_URL + url
+        return url
+
+    def get_embed_iframe(self):
+        if not self.embed:
+            return ''
+        url = settings.SITE_URL + reverse('campaign-embed_latest', kwargs={
+            'slug': self.slug
+        })
         return self.get_edit_iframe(url)
 
     @property
@@ -258,6 +279,10 @@ class InformationObject(models.Model):
     address = models.TextField(_("Address"), blank=True)
     geo = gis_models.PointField(null=True, blank=True, geography=True)
 
+    random_key = models.FloatField(
+        default=get_random_key, db_index=True, editable=False
+    )
+
     objects = InformationObjectManager()
 
     class Meta:
@@ -317,6 +342,176 @@ class InformationObject(models.Model):
             return self.foirequest.get_absolute_url()
 
 
+class CampaignSubscriptionManager(models.Manager):
+    BATCH_SIZE = 1000
+
+    def subscribe(self, campaign_id, email):
+        # Callers check the campaign, an existing subscription is ignored
+        self.bulk_create([
+            self.model(campaign_id=campaign_id, email=email)
+        ], ignore_conflicts=True)
+
+    def unsubscribe(self, campaign_id, email):
+        self.filter(campaign_id=campaign_id, email=email).delete()
+
+    def bulk_subscribe(self, rows):
+        '''
+        Inserts (campaign_id, email) rows in batches. Rows with an
+        invalid or unknown campaign, without email or that are already
+        subscribed are skipped. Returns inserted and skipped counts.
+        '''
+        inserted, skipped = 0, 0
+        batch = []
+        for campaign_id, email in rows:
+            try:
+                campaign_id = int(campaign_id)
+            except (TypeError, ValueError):
+                skipped += 1
+                continue
+            if not email:
+                skipped += 1
+                continue
+            batch.append((campaign_id, email))
+            if len(batch) >= self.BATCH_SIZE:
+                count = self._insert_batch(batch)
+                inserted += count
+                skipped += len(batch) - count
+                batch = []
+        if batch:
+            count = self._insert_batch(batch)
+            inserted += count
+            skipped += len(batch) - count
+        return inserted, skipped
+
+    def _insert_batch(self, batch):
+        campaigns = Campaign.objects.in_bulk(
+            {campaign_id for campaign_id, _email in batch}
+        )
+        existing = set(self.filter(
+            campaign_id__in=campaigns.keys(),
+            email__in={email for _campaign_id, email in batch}
+        ).values_list('campaign_id', 'email'))
+        new_rows = {
+            row for row in batch
+            if row[0] in campaigns and row not in existing
+        }
+        self.bulk_create([
+            self.model(campaign_id=campaign_id, email=email)
+            for campaign_id, email in new_rows
+        ], ignore_conflicts=True)
+        return len(new_rows)
+
+    def export_csv(self, queryset):
+        fields = [
+            "campaign_id", "email",
+        ]
+        return export_csv(queryset, fields)
+
+
 class CampaignSubscription(models.Model):
     campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE)
     email = models.EmailField()
+
+    objects = CampaignSubscriptionManager()
+
+    class Meta:
+        unique_together = ('campaign', 'email')
+
+
+class CampaignProgressManager(models.Manager):
+    def get_daily_counts(self, queryset, field, start, end):
+        date_lookup = '{}__date'.format(field)
+        counts = queryset.filter(**{
+            '{}__range'.format(date_lookup): (start, end)
+        }).annotate(
+            day=TruncDate(field)
+        ).values('day').annotate(count=Count('id')).order_by()
+        before_count = queryset.filter(**{
+            '{}__lt'.format(date_lookup): start
+        }).count()
+        return {row['day']: row['count'] for row in counts}, before_count
+
+    def update_range(self, campaign, start, end, count_locations=False):
+        """
+        Fills one row per day from `start` to `end` from request
+        timestamps. Custom locations have no timestamp, so they can only
+        be counted for `end` and only when `count_locations` is set.
+        """
+        foirequests = FoiRequest.objects.filter(
+            id__in=InformationObject.foirequests.through.objects.filter(
+                informationobject__campaign=campaign
+            ).values('foirequest_id')
+        )
+        new_requests, request_count = self.get_daily_counts(
+            foirequests, 'first_message', start, end
+        )
+        new_resolved, resolved_count = self.get_daily_counts(
+            foirequests.filter(status='resolved'), 'resolved_on', start, end
+        )
+        existing = {
+            progress.date: progress
+            for progress in self.filter(
+                campaign=campaign, date__range=(start, end)
+            )
+        }
+        previous = self.filter(
+            campaign=campaign, date__lt=start
+        ).order_by('-date').first()
+        location_count = previous.location_count if previous else None
+
+        to_create, to_update = [], []
+        day = start
+        while day <= end:
+            request_count += new_requests.get(day, 0)
+            resolved_count += new_resolved.get(day, 0)
+            progress = existing.get(day)
+            if progress is None:
+                progress = self.model(campaign=campaign, date=day)
+                to_create.append(progress)
+            else:
+                to_update.append(progress)
+            progress.request_count = request_count
+            progress.new_request_count = new_requests.get(day, 0)
+            progress.resolved_count = resolved_count
+            progress.new_resolved_count = new_resolved.get(day, 0)
+            if count_locations and day == end:
+                count = InformationObject.objects.filter(
+                    campaign=campaign, ident__startswith='custom_'
+                ).count()
+                if location_count is not None:
+                    progress.new_location_count = count - location_count
+                progress.location_count = count
+            location_count = progress.location_count
+            day += timedelta(days=1)
+
+        with transaction.atomic():
+            self.bulk_create(to_create)
+            self.bulk_update(to_update, [
+                'request_count', 'new_request_count',
+                'resolved_count', 'new_resolved_count',
+                'location_count', 'new_location_count'
+            ])
+        return len(to_create) + len(to_update)
+
+
+class CampaignProgress(models.Model):
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE)
+    date = models.DateField()
+
+    request_count = models.PositiveIntegerField(default=0)
+    new_request_count = models.PositiveIntegerField(default=0)
+    resolved_count = models.PositiveIntegerField(default=0)
+    new_resolved_count = models.PositiveIntegerField(default=0)
+    location_count = models.PositiveIntegerField(null=True, blank=True)
+    new_location_count = models.IntegerField(null=True, blank=True)
+
+    objects = CampaignProgressManager()
+
+    class Meta:
+        ordering = ('campaign', 'date')
+        unique_together = ('campaign', 'date')
+        verbose_name = _('Campaign progress')
+        verbose_name_plural = _('Campaign progress')
+
+    def __str__(self):
+        return '{} | {}'.format(self.campaign, self.date)
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
 try:
     from cms.models.pluginmodel import CMSPlugin
@@ -11,10 +12,24 @@ except ImportError:
 if CMSPlugin is not None:
 
     class CampaignRequestsCMSPlugin(CMSPlugin):
+        ORDERING_CHOICES = (
+            ('-foirequest__first_message', _('Newest requests first')),
+            ('foirequest__first_message', _('Oldest requests first')),
+            ('title', _('Title')),
+        )
+
         campaign_page = models.ForeignKey(
             CampaignPage, related_name='+',
             on_delete=models.CASCADE
         )
+        limit = models.PositiveIntegerField(
+            default=20,
+            help_text=_('Maximum number of requests shown, 0 for all')
+        )
+        ordering = models.CharField(
+            max_length=50, choices=ORDERING_CHOICES,
+            default=ORDERING_CHOICES[0][0]
+        )
 
         def __str__(self):
             return str(self.campaign_page)
@@ -33,6 +33,33 @@ class Report(models.Model):
         return '{} | {}'.format(self.questionaire.title,
                                 self.informationsobject.title)
 
+    def save_answers(self, answers):
+        '''
+        Upserts answers given as a question id to text mapping and
+        removes answers to questions that are no longer answered.
+        '''
+        existing = {
+            answer.question_id: answer for answer in self.answer_set.all()
+        }
+        new_answers, changed_answers = [], []
+        for question_id, text in answers.items():
+            answer = existing.get(question_id)
+            if answer is None:
+                new_answers.append(Answer(
+                    text=text, question_id=question_id, report=self
+                ))
+            elif answer.text != text:
+                answer.text = text
+                changed_answers.append(answer)
+
+        removed = set(existing) - set(answers)
+        if removed:
+            self.answer_set.filter(question_id__in=removed).delete()
+        if changed_answers:
+            Answer.objects.bulk_update(changed_answers, ['text'])
+        if new_answers:
+            Answer.objects.bulk_create(new_answers)
+
 
 class Answer(models.Model):
     text = models.CharField(max_length=255)
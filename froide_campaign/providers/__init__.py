@@ -1,10 +1,15 @@
 import importlib
+import threading
 
 from django.conf import settings
 
+from ..cache import make_hash
 from .base import BaseProvider
 
 PROVIDER_CLASS_CACHE = {}
+PROVIDER_INSTANCE_CACHE = {}
+
+_lock = threading.Lock()
 
 
 def get_provider_class(dotted):
@@ -13,14 +18,44 @@ def get_provider_class(dotted):
     return getattr(module, klass)
 
 
+def load_provider_classes():
+    for provider_name, provider_class_path in settings.CAMPAIGN_PROVIDERS:
+        PROVIDER_CLASS_CACHE[provider_name] = get_provider_class(
+            provider_class_path
+        )
+    PROVIDER_CLASS_CACHE.setdefault('', BaseProvider)
+
+
+def get_provider_klass(provider_name):
+    # The providers come from settings, unknown names never appear later
+    if not PROVIDER_CLASS_CACHE:
+        load_provider_classes()
+    return PROVIDER_CLASS_CACHE.get(provider_name, BaseProvider)
+
+
+def get_provider_version(campaign, provider_name, provider_kwargs):
+    return make_hash([
+        provider_name, provider_kwargs, campaign.slug,
+        campaign.subject_template, campaign.template, campaign.description
+    ])
+
+
 def get_provider(campaign, provider_name, provider_kwargs):
-    if provider_name in PROVIDER_CLASS_CACHE:
-        provider_klass = PROVIDER_CLASS_CACHE[provider_name]
-    else:
-        provider_dict = dict(settings.CAMPAIGN_PROVIDERS)
-        provider_class_path = provider_dict.get(provider_name)
-        if provider_class_path is None:
-            provider_klass = BaseProvider
-        else:
-            provider_klass = get_provider_class(provider_class_path)
-    return provider_klass(campaign, **provider_kwargs)
+    provider_klass = get_provider_klass(provider_name)
+    if campaign.pk is None:
+        return provider_klass(campaign, **provider_kwargs)
+
+    version = get_provider_version(campaign, provider_name, provider_kwargs)
+    cached = PROVIDER_INSTANCE_CACHE.get(campaign.pk)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    provider = provider_klass(campaign, **provider_kwargs)
+    with _lock:
+        PROVIDER_INSTANCE_CACHE[campaign.pk] = (version, provider)
+    return provider
+
+
+def invalidate_provider(sender, instance=None, **kwargs):
+    with _lock:
+        PROVIDER_INSTANCE_CACHE.pop(instance.pk, None)
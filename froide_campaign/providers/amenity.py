@@ -1,5 +1,6 @@
 import operator
 
+from collections import defaultdict
 from functools import reduce
 
 from django.core.exceptions import ObjectDoesNotExist
@@ -11,8 +12,6 @@ from django_amenities.models import Amenity
 from froide.publicbody.models import PublicBody
 from froide.georegion.models import GeoRegion
 
-from froide.campaign.models import Campaign
-
 from ..models import InformationObject
 
 from .base import BaseProvider, first
@@ -62,6 +61,25 @@ class AmenityProvider(BaseProvider):
         except (ValueError, ObjectDoesNotExist):
             return super().get_by_ident(ident)
 
+    def get_many_by_ident(self, idents):
+        pk_idents = defaultdict(list)
+        for ident in idents:
+            try:
+                pk_idents[int(ident.split('_')[0])].append(ident)
+            except ValueError:
+                continue
+
+        result = {}
+        amenities = self.get_queryset().filter(id__in=pk_idents.keys())
+        for amenity in amenities:
+            for ident in pk_idents[amenity.id]:
+                result[ident] = amenity
+
+        missing = [ident for ident in idents if ident not in result]
+        if missing:
+            result.update(super().get_many_by_ident(missing))
+        return result
+
     def get_provider_item_data(self, obj, foirequests=None, detail=False):
         d = {
             'ident': obj.ident,
@@ -108,24 +126,27 @@ class AmenityProvider(BaseProvider):
             return pbs[0]
         return pbs[0]
 
-    def get_publicbodies(self, ident):
-        amenity = self.get_by_ident(ident)
+    def _get_publicbody_candidates(self, amenity):
         return self._get_publicbodies(amenity)
 
+    def _get_detail_publicbodies(self, amenity):
+        pbs = list(self._get_publicbodies(amenity))
+        if not pbs:
+            return None, pbs
+        return pbs[0], pbs
+
     def get_request_url_context(self, obj):
         return {
             'title': obj.name,
             'address': obj.address
         }
 
-    def connect_request(self, ident, sender):
+    def _connect_request(self, ident, amenity, sender):
         if not sender.public:
-            return
+            return None
 
-        try:
-            amenity = self.get_by_ident(ident)
-        except Amenity.DoesNotExist:
-            return
+        if amenity is None:
+            return None
 
         context = self.get_request_url_context(amenity)
 
@@ -145,11 +166,4 @@ class AmenityProvider(BaseProvider):
             iobj.publicbody = sender.public_body
             iobj.save()
 
-        try:
-            campaign = Campaign.objects.get(ident=self.campaign.slug)
-            sender.campaign = campaign
-            sender.save()
-        except Campaign.DoesNotExist:
-            pass
-
-        iobj.foirequests.add(sender)
+        return iobj
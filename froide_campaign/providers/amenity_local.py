@@ -3,7 +3,6 @@ from django.contrib.gis.db.models.functions import Distance
 
 from froide.publicbody.models import PublicBody
 
-
 from .amenity import AmenityProvider
 
 
@@ -50,9 +49,40 @@ class AmenityLocalProvider(AmenityProvider):
 
         return super()._get_publicbody(amenity)
 
-    def get_publicbodies(self, ident):
-        amenity = self.get_by_ident(ident)
+    def _get_publicbody_candidates(self, amenity):
         same_name = self._get_same_name_pbs(amenity)
         nearby_pbs = self._get_nearby_publicbodies(amenity)
-        with_cat = super().get_publicbodies(ident)
+        with_cat = self._get_publicbodies(amenity)
         return same_name.union(nearby_pbs, with_cat)
+
+    def _get_detail_publicbodies(self, amenity):
+        """
+        Evaluates the same name, nearby and category querysets once and
+        picks the public body from them like `_get_publicbody` does.
+        """
+        same_name = list(self._get_same_name_pbs(amenity))
+        nearby = list(self._get_nearby_publicbodies(amenity).annotate(
+            distance=Distance("geo", amenity.geo)
+        ).order_by("-number_of_requests", "distance"))
+        with_cat = list(self._get_publicbodies(amenity))
+
+        candidates = list({
+            pb.id: pb for pb in same_name + nearby + with_cat
+        }.values())
+
+        if len(same_name) == 1:
+            return same_name[0], candidates
+        if nearby:
+            by_name = [pb for pb in nearby if pb.name == amenity.name]
+            if by_name:
+                return by_name[0], candidates
+            if self.kwargs.get('category'):
+                by_cat = set(PublicBody.objects.filter(
+                    id__in=[pb.id for pb in nearby],
+                    categories__name=self.kwargs['category']
+                ).values_list('id', flat=True))
+                for pb in nearby:
+                    if pb.id in by_cat:
+                        return pb, candidates
+            return nearby[0], candidates
+        return (with_cat[0] if with_cat else None), candidates
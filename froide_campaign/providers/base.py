@@ -5,17 +5,24 @@ from urllib.parse import urlencode, quote
 
 from django.urls import reverse
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils.functional import cached_property
 from django.template import Context
 from django.contrib.gis.measure import D
 from django.contrib.gis.db.models.functions import Distance
 
 from froide.campaign.models import Campaign
+from froide.foirequest.models import FoiRequest
 
+from ..cache import bump_campaign_version, make_cache_key, make_hash
 from ..models import InformationObject
 from ..serializers import CampaignProviderItemSerializer
 
 
 LIMIT = 50
+REQUEST_URL_CACHE_TIMEOUT = 60 * 60
 
 
 def first(x):
@@ -38,6 +45,15 @@ class BaseProvider:
             ident=ident
         )
 
+    def get_many_by_ident(self, idents):
+        iobjs = InformationObject.objects.filter(
+            campaign=self.campaign,
+            ident__in=idents
+        ).select_related('publicbody')
+        return {
+            iobj.ident: iobj for iobj in iobjs
+        }
+
     def get_ident_list(self, qs):
         return [
             i.ident for i in qs
@@ -52,7 +68,7 @@ class BaseProvider:
         iobjs = self.get_queryset()
         iobjs = self.filter(iobjs, **filter_kwargs)
         iobjs = self.filter_geo(iobjs, **filter_kwargs)
-        iobjs = iobjs.order_by('id').distinct()
+        iobjs = self.order(iobjs, **filter_kwargs)
         if filter_kwargs.get('limit') == '':
             iobjs = self.limit(iobjs)
 
@@ -86,7 +102,9 @@ class BaseProvider:
         return iobjs
 
     def filter_geo(self, qs, q=None, coordinates=None, radius=None, zoom=None,
-                   **kwargs):
+                   bbox=None, **kwargs):
+        if bbox is not None:
+            qs = qs.filter(geo__isnull=False, geo__coveredby=bbox)
         if coordinates is None:
             return qs
 
@@ -112,6 +130,9 @@ class BaseProvider:
 
         return qs
 
+    def order(self, qs, **filter_kwargs):
+        return qs.order_by('id').distinct()
+
     def limit(self, qs):
         return qs[:self.kwargs.get('limit', LIMIT)]
 
@@ -159,6 +180,7 @@ class BaseProvider:
     def get_foirequests_mapping(self, qs):
         ident_list = self.get_ident_list(qs)
         iobjs = InformationObject.objects.filter(
+            campaign=self.campaign,
             ident__in=ident_list
         )
         mapping = defaultdict(list)
@@ -183,11 +205,34 @@ class BaseProvider:
         return self._get_publicbody(obj)
 
     def get_publicbodies(self, ident):
-        return [self.get_publicbody(ident)]
+        obj = self.get_by_ident(ident)
+        return self._get_publicbody_candidates(obj)
 
     def _get_publicbody(self, obj):
         return obj.publicbody
 
+    def _get_publicbody_candidates(self, obj):
+        return [self._get_publicbody(obj)]
+
+    def _get_detail_publicbodies(self, obj):
+        publicbody = self._get_publicbody(obj)
+        return publicbody, [publicbody]
+
+    def detail_bundle(self, ident):
+        obj = self.get_by_ident(ident)
+        publicbody, publicbodies = self._get_detail_publicbodies(obj)
+        context = self.get_request_url_context(obj)
+
+        data = self.get_provider_item_data(obj)
+        data.update({
+            'publicbody': publicbody,
+            'publicbodies': publicbodies,
+            'makeRequestURL': self.make_request_url(
+                ident, context, publicbody
+            )
+        })
+        return data
+
     def get_request_url_redirect(self, ident):
         return reverse('campaign-redirect_to_make_request', kwargs={
             'campaign_id': self.campaign.id,
@@ -206,7 +251,27 @@ class BaseProvider:
         publicbody = self._get_publicbody(obj)
         return self.make_request_url(ident, context, publicbody)
 
+    @cached_property
+    def request_url_version(self):
+        return make_hash([
+            settings.SITE_URL,
+            self.campaign.subject_template,
+            self.campaign.template,
+            self.kwargs.get('law_type')
+        ])
+
     def make_request_url(self, ident, context, publicbody=None):
+        cache_key = make_cache_key(
+            'request_url', self.campaign.pk, self.request_url_version,
+            make_hash([ident, context, publicbody])
+        )
+        url = cache.get(cache_key)
+        if url is None:
+            url = self._make_request_url(ident, context, publicbody)
+            cache.set(cache_key, url, REQUEST_URL_CACHE_TIMEOUT)
+        return url
+
+    def _make_request_url(self, ident, context, publicbody=None):
         if publicbody is not None:
             pb_slug = publicbody.slug
             url = reverse('foirequest-make_request', kwargs={
@@ -239,27 +304,66 @@ class BaseProvider:
         query = urlencode(query, quote_via=quote)
         return '%s%s?%s' % (settings.SITE_URL, url, query)
 
-    def connect_request(self, ident, sender):
+    def get_froide_campaign(self):
         try:
-            iobj = self.get_by_ident(ident)
-        except InformationObject.DoesNotExist:
-            return
+            return Campaign.objects.get(ident=self.campaign.slug)
+        except Campaign.DoesNotExist:
+            return None
+
+    def connect_request(self, ident, sender):
+        return self.connect_requests([(ident, sender)])
+
+    def connect_requests(self, requests):
+        """
+        Connects (ident, foirequest) pairs to their information objects
+        and returns the number of links made.
+        """
+        objs = self.get_many_by_ident([ident for ident, _ in requests])
+        froide_campaign = self.get_froide_campaign()
+        through_model = InformationObject.foirequests.through
+
+        links = []
+        changed = []
+        with transaction.atomic():
+            for ident, sender in requests:
+                iobj = self._connect_request(ident, objs.get(ident), sender)
+                if iobj is None:
+                    continue
+                if (froide_campaign is not None and
+                        sender.campaign_id != froide_campaign.id):
+                    sender.campaign = froide_campaign
+                    changed.append(sender)
+                links.append(through_model(
+                    informationobject_id=iobj.id,
+                    foirequest_id=sender.id
+                ))
+            if changed:
+                FoiRequest.objects.filter(
+                    id__in=[sender.id for sender in changed]
+                ).update(campaign=froide_campaign)
+                # update() skips save signals that e.g. reindex requests
+                for sender in changed:
+                    post_save.send(
+                        sender=FoiRequest, instance=sender, created=False,
+                        update_fields=frozenset(['campaign']), raw=False,
+                        using=FoiRequest.objects.db
+                    )
+            through_model.objects.bulk_create(links, ignore_conflicts=True)
+        if links:
+            bump_campaign_version(self.campaign.id)
+        return len(links)
+
+    def _connect_request(self, ident, iobj, sender):
+        if iobj is None:
+            return None
 
         if iobj.publicbody != sender.public_body:
-            return
+            return None
 
         if not sender.public:
-            return
+            return None
 
         if iobj.foirequest is None:
             iobj.foirequest = sender
-
-        try:
-            campaign = Campaign.objects.get(ident=self.campaign.slug)
-            sender.campaign = campaign
-            sender.save()
-        except Campaign.DoesNotExist:
-            pass
-
-        iobj.foirequests.add(sender)
-        iobj.save()
+            iobj.save()
+        return iobj
@@ -1,36 +1,77 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
 from django.template.defaultfilters import slugify
 
 from froide.publicbody.models import PublicBody, Category, Classification
 from froide.georegion.models import GeoRegion
 
-from ..models import InformationObject
+from ..cache import get_tree_version, make_cache_key, make_hash
+from ..models import InformationObject, make_prefix_tsquery
 
 from .base import BaseProvider, first
 
 
+TREE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Must stay in sync with the expression index created in migration
+# 0035_publicbody_search_index so that searches can use it
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple'::regconfig, "
+    "COALESCE({table}.name, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, "
+    "COALESCE({table}.other_names, '')), 'B')"
+)
+SEARCH_QUERY_SQL = "to_tsquery('simple'::regconfig, %s)"
+
+TREE_FILTERS = (
+    ('categories', Category),
+    ('classification', Classification),
+    ('regions', GeoRegion)
+)
+
+
 class PublicBodyProvider(BaseProvider):
-    def get_queryset(self):
-        qs = PublicBody.objects.all()
-        filters = {}
-        tree_filter = (
-            ('categories', Category),
-            ('classification', Classification),
-            ('regions', GeoRegion)
+    def get_tree_filters(self):
+        tree_kwargs = {
+            key: self.kwargs[key] for key, model in TREE_FILTERS
+            if key in self.kwargs
+        }
+        if not tree_kwargs:
+            return {}
+
+        cache_key = make_cache_key(
+            'pb_tree', self.campaign.id, get_tree_version(),
+            make_hash(tree_kwargs)
         )
+        filters = cache.get(cache_key)
+        if filters is not None:
+            return filters
 
-        for key, model in tree_filter:
-            if key not in self.kwargs:
+        filters = {}
+        for key, model in TREE_FILTERS:
+            if key not in tree_kwargs:
                 continue
             try:
-                obj = model.objects.get(id=self.kwargs[key])
+                obj = model.objects.get(id=tree_kwargs[key])
             except model.DoesNotExist:
                 continue
-            filters[key + '__in'] = model.get_tree(obj)
+            filters[key + '__in'] = list(
+                model.get_tree(obj).values_list('id', flat=True)
+            )
+        cache.set(cache_key, filters, TREE_CACHE_TIMEOUT)
+        return filters
+
+    def get_queryset(self):
+        qs = PublicBody.objects.all()
+        filters = dict(self.get_tree_filters())
 
         attr_filters = (
             'jurisdiction_id',
         )
-        for key, model in attr_filters:
+        for key in attr_filters:
             if key not in self.kwargs:
                 continue
             filters[key] = self.kwargs[key]
@@ -40,22 +81,58 @@ class PublicBodyProvider(BaseProvider):
         )
 
     def filter(self, qs, **filter_kwargs):
-        if filter_kwargs.get('q'):
-            qs = qs.filter(name__contains=filter_kwargs['q'])
-        return qs
+        if not filter_kwargs.get('q'):
+            return qs
+        query = make_prefix_tsquery(filter_kwargs['q'])
+        if not query:
+            return qs
+        vector = SEARCH_VECTOR_SQL.format(table=PublicBody._meta.db_table)
+        return qs.annotate(
+            search_match=RawSQL(
+                '({}) @@ {}'.format(vector, SEARCH_QUERY_SQL), (query,),
+                output_field=BooleanField()
+            ),
+            rank=RawSQL(
+                'ts_rank({}, {})'.format(vector, SEARCH_QUERY_SQL), (query,),
+                output_field=FloatField()
+            )
+        ).filter(search_match=True)
+
+    def order(self, qs, q=None, **filter_kwargs):
+        if 'rank' in qs.query.annotations:
+            return qs.order_by('-rank', 'id').distinct()
+        if 'distance' in qs.query.annotations:
+            return qs.order_by('distance', 'id').distinct()
+        return super().order(qs, **filter_kwargs)
 
     def get_ident_list(self, qs):
         return [
-            obj.id for obj in qs
+            str(obj.id) for obj in qs
         ]
 
     def get_by_ident(self, ident):
         return self.get_queryset().get(id=ident)
 
+    def get_many_by_ident(self, idents):
+        pk_idents = defaultdict(list)
+        for ident in idents:
+            try:
+                pk_idents[int(ident)].append(ident)
+            except ValueError:
+                continue
+
+        result = {}
+        pbs = self.get_queryset().filter(id__in=pk_idents.keys())
+        for pb in pbs:
+            for ident in pk_idents[pb.id]:
+                result[ident] = pb
+        return result
+
     def get_provider_item_data(self, obj, foirequests=None, detail=False):
+        ident = str(obj.id)
         d = {
-            'ident': obj.id,
-            'request_url': self.get_request_url_redirect(obj.id),
+            'ident': ident,
+            'request_url': self.get_request_url_redirect(ident),
             'title': obj.name,
             'description': '',
             'lat': obj.geo.y if obj.geo else None,
@@ -66,8 +143,8 @@ class PublicBodyProvider(BaseProvider):
 
         if foirequests:
             d.update({
-                'foirequest': first(foirequests[str(obj.id)]),
-                'foirequests': foirequests[str(obj.id)]
+                'foirequest': first(foirequests[ident]),
+                'foirequests': foirequests[ident]
             })
         return d
 
@@ -79,18 +156,15 @@ class PublicBodyProvider(BaseProvider):
             'publicbody': obj
         }
 
-    def get_request_url_with_object(self, ident, obj):
-        context = self.get_request_url_context(obj)
-        return self.make_request_url(ident, context, obj)
+    def _get_publicbody(self, obj):
+        return obj
 
-    def connect_request(self, ident, sender):
+    def _connect_request(self, ident, pb, sender):
         if not sender.public:
-            return
+            return None
 
-        try:
-            pb = self.get_by_ident(ident)
-        except PublicBody.DoesNotExist:
-            return
+        if pb is None:
+            return None
 
         context = self.get_request_url_context(pb)
 
@@ -105,5 +179,4 @@ class PublicBodyProvider(BaseProvider):
                 foirequest=sender
             )
         )
-
-        iobj.foirequests.add(sender)
+        return iobj
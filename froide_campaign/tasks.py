@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from froide.celery import app as celery_app
+
+
+@celery_app.task(name='froide_campaign.tasks.connect_foirequests',
+                 ignore_result=True)
+def connect_foirequests_task(items=None):
+    from .utils import connect_foirequest_items, drain_connect_queue
+
+    if items is None:
+        drain_connect_queue()
+    else:
+        connect_foirequest_items(items)
+
+
+@celery_app.task(name='froide_campaign.tasks.update_campaign_page_embed',
+                 ignore_result=True)
+def update_campaign_page_embed(campaign_page_id):
+    from .models import CampaignPage
+    from .utils import build_campaign_page_embed, get_embed_schedule_key
+
+    cache.delete(get_embed_schedule_key(campaign_page_id))
+    try:
+        campaign_page = CampaignPage.objects.get(id=campaign_page_id)
+    except CampaignPage.DoesNotExist:
+        return
+    build_campaign_page_embed(campaign_page)
+
+
+@celery_app.task(name='froide_campaign.tasks.update_campaign_statistics',
+                 ignore_result=True)
+def update_campaign_statistics(campaign_id):
+    from froide.campaign.models import Campaign as FroideCampaign
+
+    from .models import Campaign
+    from .utils import refresh_campaign_statistics, get_statistics_refresh_key
+
+    try:
+        campaign = Campaign.objects.get(id=campaign_id)
+        refresh_campaign_statistics(campaign)
+    except (Campaign.DoesNotExist, FroideCampaign.DoesNotExist):
+        pass
+    finally:
+        cache.delete(get_statistics_refresh_key(campaign_id))
+
+
+@celery_app.task(name='froide_campaign.tasks.update_campaign_progress',
+                 ignore_result=True)
+def update_campaign_progress():
+    from .models import Campaign, CampaignProgress
+
+    yesterday = timezone.localdate() - timedelta(days=1)
+    for campaign in Campaign.objects.all():
+        CampaignProgress.objects.update_range(
+            campaign, yesterday, yesterday, count_locations=True
+        )
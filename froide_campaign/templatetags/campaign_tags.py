@@ -1,4 +1,5 @@
 import base64
+import functools
 import hashlib
 
 from django import template
@@ -15,7 +16,7 @@ def sha384(filepath):
     sha = hashlib.sha384()
     with open(filepath, 'rb') as f:
         while True:
-            block = f.read(1024)
+            block = f.read(64 * 1024)
             if not block:
                 break
             sha.update(block)
@@ -27,11 +28,29 @@ def subresource_integrity(filepath):
     return 'sha384-' + base64.b64encode(sha).decode('utf-8')
 
 
-@register.simple_tag
-def output_static(path):
+def read_static(path):
     result = finders.find(path)
     with open(result) as f:
-        return mark_safe(f.read())
+        return f.read()
+
+
+def get_static_integrity(path):
+    return subresource_integrity(finders.find(path))
+
+
+# Static files only change on deploy, so hashes and contents are
+# kept for the lifetime of the process unless in DEBUG
+cached_read_static = functools.lru_cache(maxsize=None)(read_static)
+cached_static_integrity = functools.lru_cache(maxsize=None)(
+    get_static_integrity
+)
+
+
+@register.simple_tag
+def output_static(path):
+    if settings.DEBUG:
+        return mark_safe(read_static(path))
+    return mark_safe(cached_read_static(path))
 
 
 @register.simple_tag
@@ -39,8 +58,10 @@ def script_tag(path):
     url = static(path)
     if not url.startswith('http'):
         url = settings.SITE_URL + url
-    filepath = finders.find(path)
-    sri = subresource_integrity(filepath)
+    if settings.DEBUG:
+        sri = get_static_integrity(path)
+    else:
+        sri = cached_static_integrity(path)
     return mark_safe(
         '<script src="{url}" integrity="{sri}" crossorigin="anonymous" '
         'async></script>'.format(url=url, sri=sri)
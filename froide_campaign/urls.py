@@ -6,13 +6,16 @@ from .views import (
     index, campaign_page,
     CampaignPageListView, CampaignPageEditView, AssignCampaignPageTeamView,
     CampaignPageEmbedView, CampaignPageUpdateEmbedView,
-    redirect_to_make_request, CampaignStatistics
+    CampaignPageEmbedStatusView,
+    redirect_to_make_request, redirect_to_embed, CampaignStatistics,
+    campaign_stats_json, campaign_page_stats_json, metrics
 )
 from .api_views import InformationObjectViewSet
 
 urlpatterns = [
     url(r'^$', index, name='campaign-index'),
     url(r'^list/$', CampaignPageListView.as_view(), name='campaign-list'),
+    url(r'^_metrics/$', metrics, name='campaign-metrics'),
     url(r'^request/(?P<campaign_id>\d+)/(?P<ident>[-\w\d]+)/$',
         redirect_to_make_request, name='campaign-redirect_to_make_request'),
     url(r'^(?P<slug>[-\w]+)/$', campaign_page, name='campaign-page'),
@@ -22,12 +25,21 @@ urlpatterns = [
         name='campaign-set_team'),
     url(r'^(?P<slug>[-\w]+)/embed/$', CampaignPageEmbedView.as_view(),
         name='campaign-embed'),
+    url(r'^(?P<slug>[-\w]+)/embed/latest/$', redirect_to_embed,
+        name='campaign-embed_latest'),
     url(r'^(?P<slug>[-\w]+)/update-embed/$',
         CampaignPageUpdateEmbedView.as_view(),
         name='campaign-updated_embed'),
+    url(r'^(?P<slug>[-\w]+)/embed-status/$',
+        CampaignPageEmbedStatusView.as_view(),
+        name='campaign-embed_status'),
     url(r'^(?P<slug>[-\w]+)/_stats/$',
         CampaignStatistics.as_view(),
-        name='campaign-statisitcs')
+        name='campaign-statisitcs'),
+    url(r'^(?P<slug>[-\w]+)/_stats/json/$', campaign_stats_json,
+        name='campaign-stats_json'),
+    url(r'^(?P<slug>[-\w]+)/stats/json/$', campaign_page_stats_json,
+        name='campaign-page_stats_json'),
 ]
 
 
@@ -1,18 +1,49 @@
+import gzip
+import hashlib
 import json
 import logging
 
+from collections import defaultdict
+
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Count, F, Q
 from django.contrib.gis.geos import Point
 from django.template.defaultfilters import slugify
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.utils import timezone
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
+from froide.campaign.models import Campaign as FroideCampaign
+from froide.foirequest.models import FoiRequest
+from froide.foirequest.models.request import Resolution
 from froide.publicbody.models import PublicBody
 
-from .models import Campaign, InformationObject
+from .cache import (make_cache_key, make_hash, get_index_version,
+                    get_campaign_versions)
+from .metrics import record_cache_lookup, incr_metric, decr_metric
+from .models import Campaign, CampaignPage, InformationObject, get_embed_path
+from .providers.base import BaseProvider
 
 logger = logging.getLogger()
 
+EMBED_TEMPLATE = 'froide_campaign/embed.html'
+EMBED_UPDATE_DELAY = 5 * 60
+EMBED_SIDECAR_SUFFIXES = ('', '.gz', '.br')
+INDEX_CACHE_TIMEOUT = 60 * 60
+PAGE_STATS_CACHE_TIMEOUT = 24 * 60 * 60
+CONNECT_BATCH_DELAY = 10
+CONNECT_BATCH_SIZE = 500
+CONNECT_QUEUE_TIMEOUT = 24 * 60 * 60
+STATISTICS_SNAPSHOT_INTERVAL = 10 * 60
+STATISTICS_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
 
 class CSVImporter(object):
     def __init__(self):
@@ -102,10 +133,495 @@ class CSVImporter(object):
         )
 
 
+def get_campaign_stats(campaign):
+    campaigns = campaign.campaigns.all()
+    qs = InformationObject.objects.filter(campaign__in=campaigns)
+    return get_information_object_stats(qs)
+
+
+def get_information_object_stats(qs):
+    counts = qs.aggregate(
+        total_count=Count('id'),
+        resolved_count=Count('id', filter=Q(resolved=True)),
+        pending_count=Count('id', filter=Q(foirequest__isnull=False)),
+        done_count=Count('id', filter=Q(foirequest__status='resolved')),
+    )
+    total_count = counts['total_count']
+    resolved_count = counts['resolved_count']
+    pending_count = counts['pending_count']
+    done_count = counts['done_count']
+
+    pending_count -= done_count
+    done_count += resolved_count
+    return {
+        'pending_count': pending_count,
+        'total_count': total_count,
+        'resolved_count': resolved_count,
+        'done_count': done_count,
+        'progress_pending': 0 if total_count == 0 else str(
+                round(pending_count / float(total_count) * 100, 1)),
+        'progress_done': 0 if total_count == 0 else str(
+                round(done_count / float(total_count) * 100, 1)),
+    }
+
+
+def get_index_campaign_pages():
+    key = make_cache_key('index', get_index_version())
+    campaign_pages = cache.get(key)
+    if campaign_pages is None:
+        campaign_pages = [
+            (page, sorted(c.id for c in page.campaigns.all()))
+            for page in CampaignPage.objects.filter(
+                public=True
+            ).prefetch_related('campaigns')
+        ]
+        cache.set(key, campaign_pages, INDEX_CACHE_TIMEOUT)
+    return campaign_pages
+
+
+def get_public_campaign_page(slug):
+    for page, campaign_ids in get_index_campaign_pages():
+        if page.slug == slug:
+            return page, campaign_ids
+    return None, None
+
+
+def get_stats_version(campaign_ids, versions=None):
+    """
+    Returns a hash over the versions of the given campaigns and the
+    latest version as a millisecond timestamp.
+    """
+    if versions is None:
+        versions = get_campaign_versions(campaign_ids)
+    pairs = sorted(
+        (campaign_id, versions[campaign_id]) for campaign_id in campaign_ids
+    )
+    last_modified = max((v for _c, v in pairs), default=None)
+    return make_hash(pairs), last_modified
+
+
+def get_stats_key(stats_version):
+    return make_cache_key('stats', stats_version)
+
+
+def get_campaigns_stats(campaign_ids, stats_version=None):
+    if stats_version is None:
+        stats_version, _last_modified = get_stats_version(campaign_ids)
+    key = get_stats_key(stats_version)
+    stats = cache.get(key)
+    record_cache_lookup('stats', stats is not None)
+    if stats is None:
+        stats = get_information_object_stats(
+            InformationObject.objects.filter(campaign_id__in=campaign_ids)
+        )
+        cache.set(key, stats, PAGE_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def get_campaign_page_summaries():
+    """
+    Returns public campaign pages with their stats. Stats are cached
+    by the versions of the page's campaigns, so only pages with changed
+    campaigns are aggregated again.
+    """
+    campaign_pages = get_index_campaign_pages()
+    versions = get_campaign_versions({
+        campaign_id
+        for _page, campaign_ids in campaign_pages
+        for campaign_id in campaign_ids
+    })
+    keys = {
+        page.id: get_stats_key(
+            get_stats_version(campaign_ids, versions=versions)[0]
+        )
+        for page, campaign_ids in campaign_pages
+    }
+    cached = cache.get_many(list(keys.values()))
+
+    summaries = []
+    missing = {}
+    for page, campaign_ids in campaign_pages:
+        key = keys[page.id]
+        stats = cached.get(key)
+        if stats is None:
+            stats = get_information_object_stats(
+                InformationObject.objects.filter(campaign_id__in=campaign_ids)
+            )
+            missing[key] = stats
+        summaries.append((page, stats))
+    if missing:
+        cache.set_many(missing, PAGE_STATS_CACHE_TIMEOUT)
+    return summaries
+
+
+class RandomOrderSequence(object):
+    """
+    Pages through `queryset` in random key order starting at `seed`
+    and wrapping around, so each part can use the random key index.
+    """
+    def __init__(self, queryset, seed):
+        queryset = queryset.order_by('random_key', 'id')
+        self.head = queryset.filter(random_key__gte=seed)
+        self.tail = queryset.filter(random_key__lt=seed)
+        self._head_count = None
+        self._count = None
+
+    def head_count(self):
+        if self._head_count is None:
+            self._head_count = self.head.count()
+        return self._head_count
+
+    def count(self):
+        if self._count is None:
+            self._count = self.head_count() + self.tail.count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('Only slicing is supported')
+        start, stop = key.start or 0, key.stop
+        head_count = self.head_count()
+        result = []
+        if start < head_count:
+            result.extend(self.head[start:min(stop, head_count)])
+        if stop > head_count:
+            result.extend(self.tail[max(start - head_count, 0):
+                                    stop - head_count])
+        return result
+
+
+def parse_random_seed(value):
+    try:
+        seed = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= seed < 1:
+        return None
+    return seed
+
+
+def save_embed_artifacts(storage, name, output):
+    storage.save(name, ContentFile(output))
+    storage.save(name + '.gz', ContentFile(gzip.compress(output)))
+    if brotli is not None:
+        storage.save(name + '.br', ContentFile(brotli.compress(output)))
+
+
+def delete_embed_artifacts(storage, name):
+    for suffix in EMBED_SIDECAR_SUFFIXES:
+        if storage.exists(name + suffix):
+            storage.delete(name + suffix)
+
+
 def make_embed(embed_file, template, context):
+    """
+    Renders the embed to a content hashed file with gzip and brotli
+    sidecars and points `embed_file` to it. The unhashed index.html
+    is kept up to date for iframes that still point to it.
+    """
     context.update({
         'build': True,
         'SITE_URL': settings.SITE_URL
     })
-    output = render_to_string(template, context=context)
-    embed_file.save('embed.html', ContentFile(output))
+    output = render_to_string(template, context=context).encode('utf-8')
+    digest = hashlib.sha256(output).hexdigest()[:16]
+
+    storage = embed_file.storage
+    instance = embed_file.instance
+    stable_name = get_embed_path(instance, 'index.html')
+    save_embed_artifacts(storage, stable_name, output)
+
+    old_name = embed_file.name
+    name = get_embed_path(instance, 'index.{}.html'.format(digest))
+    if name == old_name:
+        return
+    save_embed_artifacts(storage, name, output)
+    embed_file.name = name
+    if old_name and old_name != stable_name:
+        delete_embed_artifacts(storage, old_name)
+
+
+def build_campaign_page_embed(campaign_page):
+    stats = get_campaign_stats(campaign_page)
+    context = {
+        'object': campaign_page,
+    }
+    context.update(stats)
+    make_embed(campaign_page.embed, EMBED_TEMPLATE, context)
+    campaign_page.embed_updated = timezone.now()
+    campaign_page.save(update_fields=['embed', 'embed_updated'])
+
+
+def get_embed_schedule_key(campaign_page_id):
+    return make_cache_key('embed_scheduled', campaign_page_id)
+
+
+def is_embed_update_scheduled(campaign_page):
+    return cache.get(get_embed_schedule_key(campaign_page.id)) is not None
+
+
+def schedule_embed_update(campaign_page, delay=EMBED_UPDATE_DELAY):
+    """
+    Queues an embed build unless one is already queued, so that
+    bursts of changes collapse into one build after `delay` seconds.
+    """
+    from .tasks import update_campaign_page_embed
+
+    if not cache.add(get_embed_schedule_key(campaign_page.id), True,
+                     delay + EMBED_UPDATE_DELAY):
+        return False
+    transaction.on_commit(lambda: update_campaign_page_embed.apply_async(
+        args=[campaign_page.id], countdown=delay
+    ))
+    return True
+
+
+def get_statistics_key(campaign_id):
+    return make_cache_key('statistics', campaign_id)
+
+
+def get_statistics_refresh_key(campaign_id):
+    return make_cache_key('statistics_refresh', campaign_id)
+
+
+def compute_campaign_statistics(campaign):
+    base_stats = dict(
+        request_count=Count('*'),
+        user_count=Count('user_id', distinct=True)
+    )
+    froide_cat = FroideCampaign.objects.get(ident=campaign.slug)
+    all_requests = FoiRequest.published.filter(campaign=froide_cat)
+    aggregated = all_requests.aggregate(**base_stats)
+    success = FoiRequest.published.successful().filter(campaign=froide_cat)
+
+    by_jurisdiction = all_requests.annotate(
+        population=F('public_body__jurisdiction__region__population')
+    ).values(
+        'public_body__jurisdiction__name', 'population'
+    ).annotate(**base_stats).order_by('-request_count')
+
+    return {
+        'all_requests': aggregated['request_count'],
+        'successfull_requests': success.count(),
+        'all_users': aggregated['user_count'],
+        'by_jurisdiction': list(by_jurisdiction),
+        'updated': timezone.now()
+    }
+
+
+def refresh_campaign_statistics(campaign):
+    stats = compute_campaign_statistics(campaign)
+    cache.set(get_statistics_key(campaign.id), stats,
+              STATISTICS_CACHE_TIMEOUT)
+    return stats
+
+
+def get_empty_statistics():
+    return {
+        'all_requests': None,
+        'successfull_requests': None,
+        'all_users': None,
+        'by_jurisdiction': [],
+        'updated': None,
+        'computing': True
+    }
+
+
+def get_campaign_statistics(campaign):
+    """
+    Returns the statistics snapshot of `campaign`. Snapshots older than
+    the snapshot interval are still served while a single background
+    task computes the next one. Without any snapshot only the request
+    holding the refresh lock computes it, others get an empty snapshot.
+    """
+    from .tasks import update_campaign_statistics
+
+    stats = cache.get(get_statistics_key(campaign.id))
+    if stats is None:
+        refresh_key = get_statistics_refresh_key(campaign.id)
+        if not cache.add(refresh_key, True, STATISTICS_SNAPSHOT_INTERVAL):
+            return get_empty_statistics()
+        try:
+            return refresh_campaign_statistics(campaign)
+        finally:
+            cache.delete(refresh_key)
+    age = timezone.now() - stats['updated']
+    if age.total_seconds() > STATISTICS_SNAPSHOT_INTERVAL:
+        if cache.add(get_statistics_refresh_key(campaign.id), True,
+                     STATISTICS_SNAPSHOT_INTERVAL):
+            update_campaign_statistics.delay(campaign.id)
+    return stats
+
+
+def parse_reference(reference):
+    if not reference:
+        return None
+    if not reference.startswith('campaign:'):
+        return None
+    namespace, campaign_value = reference.split(':', 1)
+    try:
+        campaign, ident = campaign_value.split('@', 1)
+    except (ValueError, IndexError):
+        return None
+
+    try:
+        campaign_pk = int(campaign)
+    except ValueError:
+        return None
+    return campaign_pk, ident
+
+
+def get_connect_queue_key(*parts):
+    return make_cache_key('connect_queue', *parts)
+
+
+def is_cache_shared():
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return not backend.endswith(('LocMemCache', 'DummyCache'))
+
+
+def queue_connect_foirequest(item):
+    """
+    Appends a (foirequest_id, campaign_pk, ident) item to the connect
+    queue in the cache and schedules one drain for all items queued
+    within CONNECT_BATCH_DELAY. Without a cache shared with the workers
+    the item is passed to its own task instead.
+    """
+    from .tasks import connect_foirequests_task
+
+    if not is_cache_shared():
+        connect_foirequests_task.delay([item])
+        return
+    head_key = get_connect_queue_key('head')
+    cache.add(head_key, 0, None)
+    index = cache.incr(head_key)
+    cache.set(get_connect_queue_key('item', index), item,
+              CONNECT_QUEUE_TIMEOUT)
+    incr_metric('connect_queue')
+    schedule_connect_drain()
+
+
+def schedule_connect_drain():
+    from .tasks import connect_foirequests_task
+
+    # Expires soon after the drain is due, so a lost task only delays
+    # linking until the next request is queued
+    if not cache.add(get_connect_queue_key('scheduled'), True,
+                     CONNECT_BATCH_DELAY * 3):
+        return False
+    connect_foirequests_task.apply_async(countdown=CONNECT_BATCH_DELAY)
+    return True
+
+
+def connect_foirequest_items(items):
+    foirequests = FoiRequest.objects.in_bulk(
+        [foirequest_id for foirequest_id, _, _ in items]
+    )
+    return connect_foirequests([
+        (foirequests[foirequest_id], campaign_pk, ident)
+        for foirequest_id, campaign_pk, ident in items
+        if foirequest_id in foirequests
+    ])
+
+
+def connect_foirequest_items_safely(items):
+    try:
+        connect_foirequest_items(items)
+    except Exception:
+        logger.exception('Connecting campaign requests failed')
+        if len(items) == 1:
+            return
+        for item in items:
+            connect_foirequest_items_safely([item])
+
+
+def drain_connect_queue(limit=CONNECT_BATCH_SIZE):
+    """
+    Connects up to `limit` items of the connect queue in order and only
+    then removes them from the queue. An item that is missing may still
+    be in the middle of being queued, so the drain stops there once and
+    skips it as lost the next time.
+    """
+    last_key = get_connect_queue_key('last')
+    head_key = get_connect_queue_key('head')
+    missing_key = get_connect_queue_key('missing')
+    last = cache.get(last_key) or 0
+    head = cache.get(head_key) or 0
+    keys = [
+        get_connect_queue_key('item', index)
+        for index in range(last + 1, min(head, last + limit) + 1)
+    ]
+    values = cache.get_many(keys)
+    missing = cache.get(missing_key)
+
+    items = []
+    drained = last
+    for index, key in enumerate(keys, last + 1):
+        if key in values:
+            items.append(values[key])
+        elif index != missing:
+            cache.set(missing_key, index, CONNECT_QUEUE_TIMEOUT)
+            break
+        drained = index
+
+    if items:
+        connect_foirequest_items_safely(items)
+
+    cache.set(last_key, drained, None)
+    cache.delete_many(keys[:drained - last])
+    decr_metric('connect_queue', amount=drained - last)
+
+    cache.delete(get_connect_queue_key('scheduled'))
+    if drained < (cache.get(head_key) or 0):
+        schedule_connect_drain()
+    return len(items)
+
+
+def connect_foirequests(items):
+    """
+    Connects (foirequest, campaign_pk, ident) items in one batch
+    per campaign and returns the number of links made.
+    """
+    by_campaign = defaultdict(list)
+    for foirequest, campaign_pk, ident in items:
+        by_campaign[campaign_pk].append((ident, foirequest))
+
+    campaigns = Campaign.objects.in_bulk(list(by_campaign))
+    count = 0
+    for campaign_pk, requests in by_campaign.items():
+        campaign = campaigns.get(campaign_pk)
+        if campaign is None:
+            continue
+        provider = campaign.get_provider()
+        count += provider.connect_requests(requests)
+    return count
+
+
+QUESTIONAIRE_PAGE_SIZE = 20
+
+
+def get_questionaire_objects(questionaire, after=None,
+                             limit=QUESTIONAIRE_PAGE_SIZE):
+    """
+    Returns a page of successful, unreported information objects of
+    the questionaire's campaign after the given object id and whether
+    there are more.
+    """
+    iobjs = questionaire.campaign.informationobject_set.filter(
+        report__isnull=True,
+        foirequests__resolution=Resolution.SUCCESSFUL
+    ).select_related('campaign', 'publicbody').order_by('id').distinct()
+    if after is not None:
+        iobjs = iobjs.filter(id__gt=after)
+    iobjs = list(iobjs[:limit + 1])
+    has_more = len(iobjs) > limit
+    iobjs = iobjs[:limit]
+
+    provider = BaseProvider(campaign=questionaire.campaign)
+    mapping = provider.get_foirequests_mapping(iobjs)
+    data = [provider.get_provider_item_data(obj, foirequests=mapping)
+            for obj in iobjs]
+    return data, has_more
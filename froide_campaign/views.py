@@ -1,13 +1,19 @@
-from django.db.models import Count, F
+import random
+from datetime import datetime
+
 from django.views.generic import DetailView, ListView
 from django.urls import reverse
 from django.shortcuts import render, get_object_or_404, Http404, redirect
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.views.decorators.clickjacking import xframe_options_exempt
+from django.views.decorators.http import condition, require_GET
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
-from django.http import QueryDict
+from django.http import QueryDict, JsonResponse, HttpResponse
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from django import forms
 
 import django_filters
@@ -15,20 +21,28 @@ import django_filters
 from froide.team.forms import AssignTeamForm
 from froide.team.views import AssignTeamView
 from froide.campaign.models import Campaign as FroideCampaign
-from froide.foirequest.models.request import FoiRequest
 
 from froide.helper.cache import cache_anonymous_page
 from froide.helper.auth import (can_read_object, can_manage_object,
                                 can_access_object, get_read_queryset)
 
 from .models import CampaignPage, Campaign, InformationObject
-from .utils import make_embed
+from .metrics import export_metrics
+from .tasks import update_campaign_page_embed
+from .utils import (get_information_object_stats, get_campaign_stats,
+                    is_embed_update_scheduled, parse_random_seed,
+                    RandomOrderSequence, get_campaign_page_summaries,
+                    get_campaign_statistics, get_public_campaign_page,
+                    get_stats_version, get_campaigns_stats)
+
+EMBED_POINTER_MAX_AGE = 60
+STATS_MAX_AGE = 60
+COUNT_CHANGING_FILTERS = ('q', 'status', 'campaign')
 
 
-@cache_anonymous_page(15 * 60)
 def index(request):
     return render(request, 'froide_campaign/index.html', {
-        'campaign_pages': CampaignPage.objects.filter(public=True),
+        'campaign_pages': get_campaign_page_summaries(),
     })
 
 
@@ -91,33 +105,6 @@ class InformationObjectFilterSet(django_filters.FilterSet):
         return InformationObject.objects.search(queryset, value)
 
 
-def get_campaign_stats(campaign):
-    campaigns = campaign.campaigns.all()
-    qs = InformationObject.objects.filter(campaign__in=campaigns)
-    qs = qs.select_related('foirequest')
-    return get_information_object_stats(qs)
-
-
-def get_information_object_stats(qs):
-    total_count = qs.count()
-    resolved_count = qs.filter(resolved=True).count()
-    pending_count = qs.filter(foirequest__isnull=False).count()
-    done_count = qs.filter(foirequest__status='resolved').count()
-
-    pending_count -= done_count
-    done_count += resolved_count
-    return {
-        'pending_count': pending_count,
-        'total_count': total_count,
-        'resolved_count': resolved_count,
-        'done_count': done_count,
-        'progress_pending': 0 if total_count == 0 else str(
-                round(pending_count / float(total_count) * 100, 1)),
-        'progress_done': 0 if total_count == 0 else str(
-                round(done_count / float(total_count) * 100, 1)),
-    }
-
-
 @cache_anonymous_page(15 * 60)
 def campaign_page(request, slug):
     campaign_page = get_object_or_404(CampaignPage, slug=slug)
@@ -127,9 +114,8 @@ def campaign_page(request, slug):
 
     campaigns = campaign_page.campaigns.all()
     qs = InformationObject.objects.filter(campaign__in=campaigns)
-    qs = qs.select_related('foirequest')
     stats = get_information_object_stats(qs)
-    qs = qs.select_related('campaign', 'publicbody')
+    qs = qs.select_related('foirequest', 'campaign', 'publicbody')
 
     cleaned_query = QueryDict(request.GET.urlencode().encode('utf-8'),
                               mutable=True)
@@ -140,12 +126,25 @@ def campaign_page(request, slug):
     )
 
     if random_qs:
-        qs = qs.filter(foirequest__isnull=True).order_by('?')
+        seed = parse_random_seed(random_qs[0])
+        if seed is None:
+            # Pin a new seed in the URL so pagination stays stable
+            cleaned_query.pop('page', None)
+            cleaned_query['random'] = '{:.6f}'.format(random.random())
+            return redirect('{}?{}'.format(
+                request.path, cleaned_query.urlencode()
+            ))
+        cleaned_query['random'] = random_qs[0]
+        qs = RandomOrderSequence(qs.filter(foirequest__isnull=True), seed)
     else:
         qs = filterset.qs
 
     page = request.GET.get('page')
     paginator = Paginator(qs, 100)
+    if not random_qs and not any(
+            cleaned_query.get(key) for key in COUNT_CHANGING_FILTERS):
+        # Unfiltered listing has the same count as the stats
+        paginator.count = stats['total_count']
     try:
         iobjs = paginator.page(page)
     except PageNotAnInteger:
@@ -177,6 +176,100 @@ def redirect_to_make_request(self, campaign_id, ident):
     return redirect(url)
 
 
+def get_public_campaign_ids(slug):
+    campaign_id = Campaign.objects.get_public().filter(
+        slug=slug
+    ).values_list('id', flat=True).first()
+    if campaign_id is None:
+        return None
+    return [campaign_id]
+
+
+def get_page_campaign_ids(slug):
+    _page, campaign_ids = get_public_campaign_page(slug)
+    return campaign_ids
+
+
+def get_request_stats_version(request, get_campaign_ids, slug):
+    """
+    Resolves campaign ids and stats version once per request, they are
+    needed for ETag, Last-Modified and the response body.
+    """
+    if not hasattr(request, '_campaign_stats_version'):
+        campaign_ids = get_campaign_ids(slug)
+        version, last_modified = None, None
+        if campaign_ids is not None:
+            version, last_modified = get_stats_version(campaign_ids)
+        request._campaign_stats_version = (
+            campaign_ids, version, last_modified
+        )
+    return request._campaign_stats_version
+
+
+def make_stats_conditions(get_campaign_ids):
+    def get_etag(request, slug):
+        return get_request_stats_version(request, get_campaign_ids, slug)[1]
+
+    def get_last_modified(request, slug):
+        last_modified = get_request_stats_version(
+            request, get_campaign_ids, slug
+        )[2]
+        if last_modified is None:
+            return None
+        return datetime.fromtimestamp(
+            last_modified / 1000, tz=timezone.utc
+        )
+
+    return condition(etag_func=get_etag, last_modified_func=get_last_modified)
+
+
+def stats_response(request, get_campaign_ids, slug):
+    campaign_ids, version, _last_modified = get_request_stats_version(
+        request, get_campaign_ids, slug
+    )
+    if campaign_ids is None:
+        raise Http404
+    response = JsonResponse(
+        get_campaigns_stats(campaign_ids, stats_version=version)
+    )
+    patch_cache_control(response, public=True, max_age=STATS_MAX_AGE)
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+@require_GET
+@make_stats_conditions(get_public_campaign_ids)
+def campaign_stats_json(request, slug):
+    return stats_response(request, get_public_campaign_ids, slug)
+
+
+@require_GET
+@make_stats_conditions(get_page_campaign_ids)
+def campaign_page_stats_json(request, slug):
+    return stats_response(request, get_page_campaign_ids, slug)
+
+
+def can_read_metrics(request):
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, 'CAMPAIGN_METRICS_TOKEN', None)
+    if not token:
+        return False
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    if not auth.startswith('Bearer '):
+        return False
+    return constant_time_compare(auth[len('Bearer '):], token)
+
+
+@require_GET
+def metrics(request):
+    if not can_read_metrics(request):
+        raise Http404
+    return HttpResponse(
+        export_metrics(), content_type='text/plain; version=0.0.4'
+    )
+
+
 class AuthRequiredMixin(object):
     AUTH_VERB = 'write'
 
@@ -206,6 +299,7 @@ class CampaignPageEditView(AuthRequiredMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super(CampaignPageEditView, self).get_context_data(**kwargs)
+        context['embed_scheduled'] = is_embed_update_scheduled(self.object)
         if can_manage_object(self.object, self.request):
             context['team_form'] = AssignTeamForm(
                 instance=self.object,
@@ -244,59 +338,43 @@ class CampaignPageUpdateEmbedView(AuthRequiredMixin, DetailView):
 
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
-        stats = get_campaign_stats(self.object)
-        context = {
-            'object': self.object,
-        }
-        context.update(stats)
-        make_embed(
-            self.object.embed, CampaignPageEmbedView.template_name, context
-        )
-        self.object.save()
+        update_campaign_page_embed.delay(self.object.id)
         return self.get(request)
 
 
+@xframe_options_exempt
+def redirect_to_embed(request, slug):
+    campaign_page = get_object_or_404(CampaignPage, slug=slug)
+    if not campaign_page.embed:
+        raise Http404
+    response = redirect(campaign_page.get_embed_file_url())
+    patch_cache_control(response, public=True, max_age=EMBED_POINTER_MAX_AGE)
+    return response
+
+
+class CampaignPageEmbedStatusView(AuthRequiredMixin, DetailView):
+    model = CampaignPage
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        embed_updated = self.object.embed_updated
+        return JsonResponse({
+            'embed': self.object.embed.url if self.object.embed else None,
+            'embed_updated': (
+                embed_updated.isoformat() if embed_updated else None
+            ),
+            'scheduled': is_embed_update_scheduled(self.object)
+        })
+
+
 class CampaignStatistics(DetailView):
     model = Campaign
     template_name = 'froide_campaign/campaign_statistics.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['now'] = timezone.now()
-        context['stats'] = self.get_stats()
+        try:
+            context['stats'] = get_campaign_statistics(self.object)
+        except FroideCampaign.DoesNotExist:
+            raise Http404
         return context
-
-    def get_base_stats(self):
-        base_stats = dict(
-            request_count=Count('*'),
-            user_count=Count('user_id', distinct=True)
-        )
-        return base_stats
-
-    def agg_requests(self, qs):
-        return qs.annotate(
-            **self.get_base_stats()
-        ).order_by('-request_count')
-
-    def get_stats(self):
-        campaign = self.object
-
-        froide_cat = FroideCampaign.objects.get(ident=campaign.slug)
-        foirequest_total = FoiRequest.published.all()
-        all_requests = foirequest_total.filter(campaign=froide_cat)
-        aggregated = all_requests.aggregate(**self.get_base_stats())
-
-        foirequest_success = FoiRequest.published.successful()
-        success = foirequest_success.filter(campaign=froide_cat)
-
-        by_jurisdiction = self.agg_requests(
-            all_requests.annotate(
-                population=F('public_body__jurisdiction__region__population')
-            ).values('public_body__jurisdiction__name', 'population'),
-        )
-        return {
-            'all_requests': all_requests.count(),
-            'successfull_requests': success.count(),
-            'all_users': aggregated.get('user_count'),
-            'by_jurisdiction': by_jurisdiction
-        }